@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+# Бенчмарки: каждый пресет SIZES × DIFFS, отдельные системы и рендер
+# плюс сквозной цикл кадров с синтетической нагрузкой. Всё на фиксированных
+# сидах, поэтому прогоны сравнимы между собой.
+#   python bench.py --out bench.json
+#   python bench.py --baseline bench_base.json --threshold 0.15   # код 1 при регрессии
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import numpy as np
+import pygame
+from config import TILE, SIM_DT, SIZES, DIFFS
+from headless import make_game, set_size
+from input_source import RandomInput
+from mapgen import collide_move, tile_array
+from loader import build_floor
+from savegame import save_game, load_game
+from systems import enemy_ai_and_collisions, update_projectiles, update_play, spawn_projectile
+from render import draw_world, draw_lighting, draw_ui, draw_minimap
+
+SEED = 1234
+STRESS_ENEMIES = 200      # врагов сверх сгенерированных в стресс-сценарии
+STRESS_PROJECTILES = 300  # снарядов игрока в полёте
+
+def timeit(fn, number, repeat, setup=None):
+    # -> список времён одного вызова (с) по каждому повтору
+    out = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        out.append((time.perf_counter() - t0) / number)
+    return out
+
+def floor_points(g, n, rng):
+    # n случайных центров тайлов пола (мировые координаты)
+    ys, xs = np.nonzero(tile_array(g) == 0)
+    pick = rng.integers(0, len(xs), n)
+    return [pygame.Vector2(x * TILE + TILE / 2, y * TILE + TILE / 2) for x, y in zip(xs[pick].tolist(), ys[pick].tolist())]
+
+def immortal(g):
+    # Игрок не должен умереть посреди замера
+    g.player.hp = g.player.hp_max = 10 ** 6
+
+def add_enemies(g, n, rng):
+    pts = floor_points(g, n, rng)
+    g.enemies.add_many([p.x for p in pts], [p.y for p in pts], np.arange(n) % 4 == 0,
+                       rng.random(n) * 10.0, rng.uniform(0.0, 1.2, n))
+
+def fill_projectiles(g, n, rng):
+    # Снаряды игрока веером от случайных точек пола; живут дольше замера
+    g.projectiles.clear()
+    ang = rng.random(n) * 2 * np.pi
+    for pos, a in zip(floor_points(g, n, rng), ang.tolist()):
+        spawn_projectile(g, pos.x, pos.y, np.cos(a) * 40.0, np.sin(a) * 40.0, 60.0)
+        g.projectiles[-1].dmg = 0
+
+def bench_scenario(g, size, diff, scale):
+    set_size(g, size)
+    g.settings["difficulty"] = diff
+    g.settings["lighting"] = True
+    g.input = RandomInput(SEED)
+    g.new_run(SEED)
+    g.show_minimap = True
+    immortal(g)
+    rng = np.random.default_rng(SEED)
+    res = {}
+
+    def record(name, times, per=1):
+        best = min(times)
+        res[name] = {
+            "best_ms": best * 1000,
+            "median_ms": statistics.median(times) * 1000,
+            "ops": per / best,
+        }
+
+    # Генерация этажа (заново на каждый вызов, сиды фиксированы);
+    # в бесконечном режиме — всё начальное окно чанков
+    seeds = iter(range(10 ** 6))
+    gen = lambda: build_floor(g.settings, next(seeds))
+    record("generate_new_floor", timeit(gen, 2, 3 * scale))
+    g.new_run(SEED)
+    immortal(g)
+
+    # Сдвиг окна бесконечного мира на чанк (туда-обратно)
+    if g.world is not None:
+        step = [g.world.chunk * TILE]
+        def shift():
+            g.player.pos.x += step[0]
+            g.world.update(g)
+            step[0] = -step[0]
+        record("world_shift", timeit(shift, 10, 3 * scale))
+        g.new_run(SEED)
+        immortal(g)
+
+    # Снимок забега; он же потом восстанавливает сценарий без новой генерации
+    fd, snap = tempfile.mkstemp(suffix=".tds")
+    os.close(fd)
+    record("save_game", timeit(lambda: save_game(g, snap), 5, 3 * scale))
+    record("load_game", timeit(lambda: load_game(g, snap), 5, 3 * scale))
+
+    # Коллизии: пачка перемещений из случайных точек пола
+    pts = floor_points(g, 1000, rng)
+    moves = [pygame.Vector2(x, y) for x, y in (rng.random((1000, 2)) * 8 - 4).tolist()]
+    pairs = list(zip(pts, moves))
+    def collide_batch():
+        for p, m in pairs:
+            collide_move(g, p, m, 10)
+    record("collide_move", timeit(collide_batch, 1, 5 * scale), per=len(pairs))
+
+    # ИИ врагов: сгенерированные + стресс
+    add_enemies(g, STRESS_ENEMIES, rng)
+    record("enemy_ai_and_collisions", timeit(lambda: enemy_ai_and_collisions(g, SIM_DT), 20, 5 * scale))
+    immortal(g)
+
+    # Снаряды: перед каждым повтором набор пересоздаётся
+    record("update_projectiles", timeit(lambda: update_projectiles(g, SIM_DT), 20, 5 * scale,
+                                        setup=lambda: fill_projectiles(g, STRESS_PROJECTILES, rng)))
+    g.projectiles.clear()
+
+    # Рендер
+    record("draw_world", timeit(lambda: draw_world(g), 20, 5 * scale))
+    record("draw_lighting", timeit(lambda: draw_lighting(g), 20, 5 * scale))
+    record("draw_minimap", timeit(lambda: draw_minimap(g), 20, 5 * scale))
+
+    # Сквозной цикл: ввод, симуляция и рендер со стресс-нагрузкой
+    load_game(g, snap)
+    os.remove(snap)
+    add_enemies(g, STRESS_ENEMIES, rng)
+    def frame():
+        if len(g.projectiles) < STRESS_PROJECTILES // 2:
+            fill_projectiles(g, STRESS_PROJECTILES, rng)
+        g.controls.dispatch(g.input.poll(g), "play")
+        update_play(g, SIM_DT)
+        draw_world(g)
+        draw_lighting(g)
+        draw_ui(g)
+    record("frame_stress", timeit(frame, 60, 3 * scale))
+    return res
+
+def compare(results, baseline, threshold):
+    # -> список регрессий: (ключ, было ops, стало ops)
+    bad = []
+    for key, r in results.items():
+        b = baseline.get(key)
+        if b and r["ops"] < b["ops"] * (1 - threshold):
+            bad.append((key, b["ops"], r["ops"]))
+    return bad
+
+def main():
+    ap = argparse.ArgumentParser(description="Бенчмарки Treasure Dungeons")
+    ap.add_argument("--out", default="bench.json", help="куда сохранить результаты (JSON)")
+    ap.add_argument("--baseline", default=None, help="JSON прошлого прогона для сравнения")
+    ap.add_argument("--threshold", type=float, default=0.15, help="допустимое падение пропускной способности (доля)")
+    ap.add_argument("--size", action="append", choices=[n for n, _, _ in SIZES], help="только эти размеры")
+    ap.add_argument("--difficulty", action="append", choices=list(DIFFS), help="только эти сложности")
+    ap.add_argument("--scale", type=int, default=1, help="множитель числа повторов")
+    args = ap.parse_args()
+
+    g = make_game()
+    results = {}
+    t0 = time.perf_counter()
+    for size in args.size or [n for n, _, _ in SIZES]:
+        for diff in args.difficulty or list(DIFFS):
+            for name, r in bench_scenario(g, size, diff, args.scale).items():
+                key = f"{size}/{diff}/{name}"
+                results[key] = r
+                print(f"{key:<50} {r['best_ms']:9.3f} мс  {r['ops']:12.0f} оп/с")
+    pygame.quit()
+
+    out = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": sys.version.split()[0],
+            "pygame": pygame.version.ver,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "seed": SEED,
+            "wall_time": time.perf_counter() - t0,
+        },
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(out, f, ensure_ascii=False, indent=1)
+    print(f"Результаты: {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        bad = compare(results, baseline, args.threshold)
+        for key, was, now in bad:
+            print(f"РЕГРЕССИЯ {key}: {was:.0f} -> {now:.0f} оп/с ({now / was - 1:+.0%})")
+        if bad:
+            raise SystemExit(1)
+        print(f"Регрессий нет (порог {args.threshold:.0%}, сравнено {sum(k in baseline for k in results)} замеров)")
+
+if __name__ == "__main__":
+    main()
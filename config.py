@@ -1,5 +1,4 @@
 # -*- coding: utf-8 -*-
-import pygame
 
 # Экран и тайлы
 SCREEN_W, SCREEN_H = 1024, 576
@@ -16,9 +15,27 @@ COL_GREEN = (120, 255, 160)
 COL_UI = (230, 235, 240)
 COL_DIM = (140, 150, 160)
 
+# Фиксированный шаг симуляции (headless)
+SIM_DT = 1 / 60
+
+# Частота кадров окна; на статичных экранах (меню, оверлеи) без изменений — реже
+FPS = 60
+IDLE_FPS = 20
+
 # Освещение
 LIGHT_RADIUS = 200
 LIGHT_SOFT = 160
+LIGHT_DARK = 220        # альфа тьмы вне света
+LIGHT_AMBIENT = 24      # альфа в центре источника
+SHOP_LIGHT = (70, 60)           # (radius, soft) свечения магазина
+EXIT_LIGHT = (36, 40)           # открытый выход
+TREASURE_LIGHT = (10, 22)       # свечение сокровищ
+
+# Поле зрения (тайлы); покрывает радиус света игрока
+FOV_RADIUS = 15
+
+# Поле потока для преследования: длина пути в тайлах (с запасом к радиусу погони 300 px)
+FLOW_RADIUS = 24
 
 # Сложность
 DIFFS = {
@@ -27,11 +44,20 @@ DIFFS = {
     "Сложная":  {"enemy_mult": 1.5, "enemy_speed": 1.15, "player_hp": 4, "sell_mult": 0.9,  "spitter_chance": 0.35, "target_mult": 1.2,  "player_fire_rate": 0.26},
 }
 
-# Размеры карт (пресеты)
+# Бесконечный режим: мир из чанков WORLD_CHUNK×WORLD_CHUNK тайлов, генерируемых
+# по сиду по мере приближения игрока. В памяти — окно WORLD_WINDOW×WORLD_WINDOW
+# чанков вокруг него (WORLD_CHUNK кратен чанку кэша тайлов, 16)
+ENDLESS_SIZE = "Бесконечный"
+WORLD_CHUNK = 32
+WORLD_WINDOW = 5
+WORLD_ARCHIVE_MEM = 256     # спящих чанков в памяти, остальные — во временном файле
+
+# Размеры карт (пресеты); у бесконечного — размер окна
 SIZES = [
     ("Маленький", 60, 40),
     ("Средний", 80, 50),
     ("Большой", 110, 70),
+    (ENDLESS_SIZE, WORLD_CHUNK * WORLD_WINDOW, WORLD_CHUNK * WORLD_WINDOW),
 ]
 
 # Типы сокровищ
@@ -43,14 +69,39 @@ TREASURE_TYPES = [
     {"name": "Реликвия", "value": 200, "color": (200, 160, 255), "weight": 1},
 ]
 
+# Лимиты пулов
+PARTICLE_CAP = 4096
+PROJECTILE_CAP = 1024    # снарядов в полёте; лишние выстрелы не рождаются
+FLOAT_TEXT_CAP = 128
+TEXT_CACHE_SIZE = 256   # отрисованных строк в LRU-кэше
+
+# Быстрое сохранение (F5 — сохранить, F9 — загрузить), см. savegame.py
+QUICKSAVE = "quicksave.tds"
+
+# Холодный старт: кэш путей системных шрифтов (fonts.py) и бюджет времени
+# от запуска до первого кадра меню (startup.py, main --startup)
+FONT_CACHE = "fontcache.json"
+STARTUP_BUDGET_MS = 500
+
+# Переназначение клавиш поверх раскладки по умолчанию (controls.py), если файл есть:
+#   {"play": {"fire": ["mouse1", "space"], "dash": ["left ctrl"]}}
+KEYMAP_FILE = "keymap.json"
+
+# Миникарта: размеры панели (обычная/крупная) и уровни зума
+MINIMAP_SIZES = ((280, 220), (640, 440))
+MINIMAP_ZOOMS = (1, 2, 4)
+
 # Состояния
 STATE_MENU = "menu"
 STATE_PLAY = "play"
 STATE_DEAD = "dead"
 STATE_WIN = "win"
+STATE_LOADING = "loading"   # этаж строится в фоне (loader.FloorJob)
 
 # Утилита рисования
+# (pygame — внутри: config читают и инструменты без окна, им он не нужен)
 def draw_round_rect(surf, rect, color, radius=8, border=0, border_color=(0,0,0,0)):
+    import pygame
     pygame.draw.rect(surf, border_color if border else color, rect, border_radius=radius)
     if border:
         inner = pygame.Rect(rect)
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+import json
+import pygame
+from config import STATE_MENU, STATE_PLAY, STATE_DEAD, STATE_WIN
+
+# Слой ввода между источником (g.input) и игрой. События кадра разбираются
+# один раз: клавиша или кнопка мыши по раскладке контекста становится действием.
+#   глобальные действия и действия экранов (меню, смерть/победа) — сразу
+#     из dispatch, main разбирает их списком;
+#   действия игры — в очередь с отметкой времени; шаг симуляции (take)
+#     забирает пришедшие за его отрезок вместе со смещением от начала шага;
+#   удерживаемые (движение) — по нажатым привязкам, на момент шага.
+# Рендер и симуляция могут идти с разной частотой: пришедшее за кадр ждёт в
+# очереди свой шаг, а не теряется и не применяется дважды.
+# Время в очереди — в долях шага (SUBSTEPS на шаг). Живые события pygame
+# меток времени не несут и ставятся на начало ближайшего шага; скриптовые
+# источники и реплей подают действия мимо раскладки (push, held, aim)
+# с точным смещением, и симуляция его учитывает (рывок, выстрел).
+
+SUBSTEPS = 256
+MOUSE_LEFT = ("mouse", 1)
+
+# Удерживаемые действия; порядок — биты маски StepInput.held и лога реплея
+HELD = ("up", "left", "down", "right")
+HOLD_UP, HOLD_LEFT, HOLD_DOWN, HOLD_RIGHT = 1, 2, 4, 8
+# Действия шага симуляции; индекс — код действия в логе реплея
+PLAY_ACTIONS = ("fire", "dash", "sell", "help", "minimap", "zoom_in", "zoom_out", "minimap_size")
+
+# Контекст раскладки по состоянию игры; на экране загрузки — только глобальные
+CONTEXTS = {STATE_MENU: "menu", STATE_PLAY: "play", STATE_DEAD: "end", STATE_WIN: "end"}
+
+DEFAULT_KEYMAP = {
+    "global": {
+        pygame.K_ESCAPE: "quit", pygame.K_F3: "profiler", pygame.K_F4: "profile_dump",
+        pygame.K_F5: "quicksave", pygame.K_F9: "quickload",
+    },
+    "menu": {
+        pygame.K_UP: "menu_up", pygame.K_DOWN: "menu_down",
+        pygame.K_LEFT: "menu_left", pygame.K_RIGHT: "menu_right", pygame.K_RETURN: "start",
+    },
+    "play": {
+        pygame.K_w: "up", pygame.K_a: "left", pygame.K_s: "down", pygame.K_d: "right",
+        MOUSE_LEFT: "fire", pygame.K_SPACE: "fire",
+        pygame.K_LSHIFT: "dash", pygame.K_RSHIFT: "dash",
+        pygame.K_e: "sell", pygame.K_F1: "help",
+        pygame.K_TAB: "minimap", pygame.K_b: "minimap_size",
+        pygame.K_EQUALS: "zoom_in", pygame.K_PLUS: "zoom_in", pygame.K_KP_PLUS: "zoom_in",
+        pygame.K_MINUS: "zoom_out", pygame.K_KP_MINUS: "zoom_out",
+    },
+    # Экраны смерти и победы
+    "end": {pygame.K_r: "restart", pygame.K_m: "to_menu", MOUSE_LEFT: "click"},
+}
+
+def parse_binding(name):
+    # "mouse1" -> ("mouse", 1), иначе имя клавиши pygame ("w", "left shift", "f5")
+    if name.startswith("mouse") and name[5:].isdigit():
+        return ("mouse", int(name[5:]))
+    return pygame.key.key_code(name)
+
+class StepInput:
+    # Ввод одного шага симуляции
+    __slots__ = ("held", "aim", "actions")
+
+    def __init__(self, held, aim, actions):
+        self.held = held            # маска HOLD_*
+        self.aim = aim              # курсор в экранных координатах
+        self.actions = actions      # [(действие, смещение в долях шага)] по времени
+
+class Controls:
+    def __init__(self, keymap=DEFAULT_KEYMAP):
+        self.keymap = {ctx: dict(m) for ctx, m in keymap.items()}
+        self.down = set()           # нажатые привязки
+        self.held = set()           # удерживаемые действия от скриптовых источников
+        self.aim = (0, 0)
+        self.queue = []             # (отметка в долях шага, действие)
+        self.step = 0               # номер следующего шага симуляции
+
+    def bind(self, context, binding, action):
+        # Переназначить привязку в контексте; action None — снять
+        m = self.keymap.setdefault(context, {})
+        if action is None:
+            m.pop(binding, None)
+        else:
+            m[binding] = action
+
+    def load(self, path):
+        # Переопределения из JSON: {"контекст": {"действие": ["клавиша", ...]}};
+        # перечисленные действия теряют привязки по умолчанию
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        for context, actions in data.items():
+            m = self.keymap.setdefault(context, {})
+            for action, names in actions.items():
+                for b in [b for b, a in m.items() if a == action]:
+                    del m[b]
+                for name in names:
+                    try:
+                        m[parse_binding(name)] = action
+                    except ValueError:
+                        raise ValueError(f"{path}: неизвестная клавиша {name!r} для {action}") from None
+
+    def dispatch(self, events, context):
+        # -> глобальные действия и действия экрана по порядку; игровые — в очередь
+        out = []
+        glob = self.keymap["global"]
+        local = self.keymap.get(context, {})
+        play = context == "play"
+        stamp = self.step * SUBSTEPS
+        for e in events:
+            t = e.type
+            if t == pygame.KEYDOWN or t == pygame.MOUSEBUTTONDOWN:
+                if t == pygame.KEYDOWN:
+                    b = e.key
+                else:
+                    b = ("mouse", e.button)
+                    self.aim = getattr(e, "pos", self.aim)
+                self.down.add(b)
+                if b in glob:
+                    out.append(glob[b])
+                    continue
+                action = local.get(b)
+                if action is None or action in HELD:
+                    continue
+                if play:
+                    self.queue.append((stamp, action))
+                else:
+                    out.append(action)
+            elif t == pygame.KEYUP:
+                self.down.discard(e.key)
+            elif t == pygame.MOUSEBUTTONUP:
+                self.down.discard(("mouse", e.button))
+            elif t == pygame.MOUSEMOTION:
+                self.aim = e.pos
+            elif t == pygame.QUIT:
+                out.append("quit")
+            elif t == pygame.WINDOWFOCUSLOST:
+                # Отпущенное вне окна KEYUP не пришлёт
+                self.down.clear()
+            elif t in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED, pygame.WINDOWRESTORED):
+                out.append("expose")
+        return out
+
+    def push(self, action, sub=0):
+        # Хук скриптового ввода: действие игры через sub долей шага от начала следующего
+        self.queue.append((self.step * SUBSTEPS + sub, action))
+
+    def take(self):
+        # Ввод следующего шага симуляции
+        base = self.step * SUBSTEPS
+        play = self.keymap["play"]
+        held = self.held | {play[b] for b in self.down if play.get(b) in HELD}
+        bits = 0
+        for i, a in enumerate(HELD):
+            if a in held:
+                bits |= 1 << i
+        # Сортировка устойчивая: при равных отметках — в порядке прихода
+        q = self.queue
+        q.sort(key=lambda a: a[0])
+        n = 0
+        while n < len(q) and q[n][0] < base + SUBSTEPS:
+            n += 1
+        actions = [(action, max(0, stamp - base)) for stamp, action in q[:n]]
+        del q[:n]
+        self.step += 1
+        return StepInput(bits, self.aim, actions)
+
+    def flush(self):
+        # Вне игры очередь не копится; удержание от скриптовых источников снимается
+        self.queue.clear()
+        self.held.clear()
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import pygame
+
+class DirtyScreen:
+    # Обновление окна по грязным прямоугольникам вместо flip() каждый кадр.
+    # Сцена (меню, оверлей смерти, загрузка) рисуется целиком один раз —
+    # begin() вернёт True; дальше слои (строки меню, кнопки, ...) сообщают
+    # через layer() свой ключ и место, и перерисовываются только при их
+    # смене. present() отдаёт окну лишь изменившиеся области, а если их нет —
+    # не трогает окно вовсе, так что статичные экраны почти не грузят CPU.
+    # Сцены со скроллом (игра) просто вызывают invalidate() каждый кадр.
+    def __init__(self):
+        self.scene = None
+        self.layers = {}    # имя -> (ключ, прямоугольник)
+        self.rects = []
+        self.whole = True
+
+    def begin(self, scene):
+        if scene == self.scene and not self.whole:
+            return False
+        self.scene = scene
+        self.layers.clear()
+        self.whole = True
+        return True
+
+    def invalidate(self):
+        # Всё окно грязное: сцена со скроллом или окно было перекрыто
+        self.whole = True
+
+    def layer(self, name, key, rect):
+        # True — слой изменился и его надо перерисовать; грязными становятся
+        # и прежнее, и новое его место
+        rect = pygame.Rect(rect)
+        prev = self.layers.get(name)
+        if prev == (key, rect):
+            return False
+        if prev is not None:
+            self.rects.append(prev[1])
+        self.rects.append(rect)
+        self.layers[name] = (key, rect)
+        return True
+
+    def present(self):
+        # -> было ли что показать
+        if self.whole:
+            pygame.display.flip()
+        elif self.rects:
+            pygame.display.update(self.rects)
+        else:
+            return False
+        self.whole = False
+        self.rects.clear()
+        return True
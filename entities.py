@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pygame
+from spatial import GridIndex
+
+# Сущности — классы со __slots__ вместо dict: атрибуты читаются по
+# смещению в объекте без хеширования строки, объект в разы меньше.
+# Коллекции остаются списками в Game (g.treasures, ...), системы обходят
+# их напрямую: `for it in g.treasures: it.pos ...`. Враги — исключение:
+# их тысячи и ИИ считается пакетно, поэтому они в EnemyStore.
+
+class Player:
+    __slots__ = ("pos", "speed", "hp", "hp_max", "dash_cd", "dash_time", "dash_mult",
+                 "hurt_cd", "sell_cd", "dir", "shoot_cd", "fire_rate", "proj_speed", "recoil")
+
+    def __init__(self):
+        self.pos = pygame.Vector2(0, 0)
+        self.speed = 170.0
+        self.hp = 5
+        self.hp_max = 5
+        self.dash_cd = 0.0
+        self.dash_time = 0.0
+        self.dash_mult = 2.6
+        self.hurt_cd = 0.0
+        self.sell_cd = 0.0
+        self.dir = pygame.Vector2(1, 0)
+        self.shoot_cd = 0.0
+        self.fire_rate = 0.22
+        self.proj_speed = 420.0
+        self.recoil = 12.0
+
+class EnemyStore:
+    # Враги в параллельных массивах numpy, живые — в [0, n):
+    #   x, y     позиция центра (мир)
+    #   hp       здоровье; <= 0 — убит, вычищается в compact()
+    #   t        своё время (фаза блуждания)
+    #   spitter  плевун (иначе — бегун)
+    #   chase    преследует игрока (иначе блуждает)
+    #   atk_cd   перезарядка плевка
+    FIELDS = (("x", np.float64), ("y", np.float64), ("hp", np.int32), ("t", np.float64),
+              ("spitter", np.bool_), ("chase", np.bool_), ("atk_cd", np.float64))
+
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        for name, dtype in self.FIELDS:
+            setattr(self, name, np.zeros(capacity, dtype))
+        self.n = 0
+        self.index = GridIndex()
+        self.index_dirty = True
+
+    def __len__(self):
+        return self.n
+
+    def clear(self):
+        self.n = 0
+        self.index_dirty = True
+
+    def _reserve(self, n):
+        if n <= self.capacity:
+            return
+        cap = max(n, self.capacity * 2)
+        for name, _ in self.FIELDS:
+            arr = getattr(self, name)
+            grown = np.zeros(cap, arr.dtype)
+            grown[:self.n] = arr[:self.n]
+            setattr(self, name, grown)
+        self.capacity = cap
+
+    def add_many(self, xs, ys, spitter, t, atk_cd):
+        k = len(xs)
+        self._reserve(self.n + k)
+        s = slice(self.n, self.n + k)
+        self.x[s] = xs
+        self.y[s] = ys
+        self.spitter[s] = spitter
+        self.hp[s] = np.where(spitter, 2, 3)
+        self.t[s] = t
+        self.chase[s] = False
+        self.atk_cd[s] = atk_cd
+        self.n += k
+        self.index_dirty = True
+
+    def compact(self):
+        # Выжать убитых, сохранив порядок живых
+        n = self.n
+        alive = self.hp[:n] > 0
+        if alive.all():
+            return
+        m = int(alive.sum())
+        for name, _ in self.FIELDS:
+            arr = getattr(self, name)
+            arr[:m] = arr[:n][alive]
+        self.n = m
+        self.index_dirty = True
+
+    def take(self, mask):
+        # Вынуть врагов по маске над [0, n): -> {поле: массив}, порядок оставшихся сохраняется
+        n = self.n
+        out = {name: getattr(self, name)[:n][mask] for name, _ in self.FIELDS}
+        keep = ~mask
+        m = int(keep.sum())
+        for name, _ in self.FIELDS:
+            arr = getattr(self, name)
+            arr[:m] = arr[:n][keep]
+        self.n = m
+        self.index_dirty = True
+        return out
+
+    def put(self, fields):
+        # Вернуть вынутых take() (все поля как есть)
+        k = len(fields["x"])
+        self._reserve(self.n + k)
+        for name, _ in self.FIELDS:
+            getattr(self, name)[self.n:self.n + k] = fields[name]
+        self.n += k
+        self.index_dirty = True
+
+    def query_radius(self, x, y, r):
+        # Индексы живых врагов, чей центр строго ближе r к (x, y)
+        if self.index_dirty:
+            self.index.build(self.x[:self.n], self.y[:self.n])
+            self.index_dirty = False
+        hits = self.index.query_radius(x, y, r)
+        if hits:
+            hp = self.hp
+            hits = [i for i in hits if hp[i] > 0]
+        return hits
+
+class Treasure:
+    # type — индекс в TREASURE_TYPES; подобранные лежат в g.inventory как есть;
+    # idx — место в g.treasures для удаления обменом (см. systems.remove_treasure)
+    __slots__ = ("pos", "type", "idx")
+
+    def __init__(self, pos, type):
+        self.pos = pos
+        self.type = type
+        self.idx = -1
+
+class Projectile:
+    # Живут в EntityPool: векторы создаются один раз и обновляются на месте
+    __slots__ = ("pos", "vel", "life", "dmg", "from_enemy")
+
+    def __init__(self):
+        self.pos = pygame.Vector2()
+        self.vel = pygame.Vector2()
+        self.life = 0.0
+        self.dmg = 1
+        self.from_enemy = False
+
+class FloatText:
+    # Тоже из EntityPool
+    __slots__ = ("text", "pos", "vy", "time", "color", "life")
+
+    def __init__(self):
+        self.text = ""
+        self.pos = pygame.Vector2()
+        self.vy = -22
+        self.time = 0.0
+        self.color = (230, 230, 230)
+        self.life = 1.2
+
+class EntityPool:
+    # Фиксированный набор заранее созданных объектов. Живые лежат в
+    # items[0:n]; удаление — обмен с последним живым (порядок не
+    # сохраняется), объект остаётся в пуле и переиспользуется.
+    def __init__(self, factory, capacity):
+        self.capacity = capacity
+        self.items = [factory() for _ in range(capacity)]
+        self.n = 0
+
+    def __len__(self):
+        return self.n
+
+    def __iter__(self):
+        items = self.items
+        for i in range(self.n):
+            yield items[i]
+
+    def __getitem__(self, i):
+        if not -self.n <= i < self.n:
+            raise IndexError(i)
+        return self.items[i % self.n]
+
+    def clear(self):
+        self.n = 0
+
+    def spawn(self):
+        # Свободный объект для заполнения или None, если пул полон
+        if self.n == self.capacity:
+            return None
+        obj = self.items[self.n]
+        self.n += 1
+        return obj
+
+    def kill(self, i):
+        # Удалить i-й живой; на его место встаёт последний
+        n = self.n - 1
+        items = self.items
+        items[i], items[n] = items[n], items[i]
+        self.n = n
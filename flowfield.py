@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+from collections import deque
+import numpy as np
+from config import TILE, FLOW_RADIUS
+from mapgen import world_to_tile
+
+class FlowField:
+    # Поле путей к игроку (BFS по проходимым тайлам, не дальше FLOW_RADIUS шагов).
+    # Для каждого достигнутого тайла заранее выбран следующий тайл пути в
+    # массиве step (MAP_H, MAP_W, 2), так что враги узнают направление
+    # пакетно за O(1). При смене тайла игрока сбрасываются только клетки,
+    # записанные прошлым обновлением, а не весь массив карты.
+    def __init__(self, radius=FLOW_RADIUS):
+        self.radius = radius
+        self.origin = None
+        self.step = None
+        self.written = None     # (ys, xs) клеток step, заполненных последним update
+
+    def reset(self):
+        self.origin = None
+        self.step = None
+        self.written = None
+
+    def update(self, g):
+        tx, ty = world_to_tile(g.player.pos.x, g.player.pos.y)
+        if (tx, ty) == self.origin:
+            return
+        self.origin = (tx, ty)
+        data, off, stride = g.tiles.data, g.tiles.offset, g.tiles.stride
+        # BFS по 4 соседям; родитель тайла — его следующий шаг к игроку
+        dist = {(tx, ty): 0}
+        parent = {}
+        q = deque([(tx, ty)])
+        radius = self.radius
+        while q:
+            c = q.popleft()
+            x, y = c
+            d = dist[c] + 1
+            if d > radius:
+                continue
+            for n in ((x+1, y), (x-1, y), (x, y+1), (x, y-1)):
+                nx, ny = n
+                # Рамка TileMap — стены, так что проверка границ не нужна
+                if data[off + ny * stride + nx] == 0 and n not in dist:
+                    dist[n] = d
+                    parent[n] = c
+                    q.append(n)
+
+        # Срезаем углы: если через шаг путь уходит по диагонали и оба
+        # ортогональных прохода свободны, шагаем сразу по диагонали
+        cells = []
+        steps = []
+        for c, p in parent.items():
+            gp = parent.get(p)
+            if gp is not None:
+                x, y = c
+                gx, gy = gp
+                if (abs(gx - x) == 1 and abs(gy - y) == 1 and
+                        data[off + y * stride + gx] == 0 and data[off + gy * stride + x] == 0):
+                    p = gp
+            cells.append(c)
+            steps.append(p)
+
+        if self.step is None or self.step.shape[:2] != (g.MAP_H, g.MAP_W):
+            self.step = np.full((g.MAP_H, g.MAP_W, 2), -1, np.int32)
+        elif self.written is not None:
+            self.step[self.written] = -1
+        self.written = None
+        if cells:
+            src = np.array(cells, np.intp)
+            self.written = (src[:, 1], src[:, 0])
+            self.step[self.written] = np.array(steps, np.int32)
+
+    def next_points(self, xs, ys):
+        # Центры следующих тайлов пути для N мировых точек: (nx, ny, ok);
+        # ok ложно, если тайл вне поля или это тайл игрока
+        n = len(xs)
+        if self.step is None or n == 0:
+            return np.zeros(n), np.zeros(n), np.zeros(n, bool)
+        h, w = self.step.shape[:2]
+        tx = np.floor_divide(xs, TILE).astype(np.intp)
+        ty = np.floor_divide(ys, TILE).astype(np.intp)
+        inside = (tx >= 0) & (tx < w) & (ty >= 0) & (ty < h)
+        st = self.step[np.where(inside, ty, 0), np.where(inside, tx, 0)]
+        ok = inside & (st[:, 0] >= 0)
+        return st[:, 0] * TILE + TILE / 2, st[:, 1] * TILE + TILE / 2, ok
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import pygame
+from config import FONT_CACHE
+
+# Системные шрифты по имени без сканирования системы на каждом старте.
+# Первый SysFont строит список всех установленных шрифтов (fc-list на
+# Linux, реестр на Windows) — на холодном старте это самый долгий шаг после
+# импортов. Выбор SysFont (файл и нужна ли искусственная жирность)
+# запоминается в FONT_CACHE; пропавший файл или новое имя — повод
+# один раз спросить систему заново.
+
+def make_font(path, size, bold):
+    # Как конструктор SysFont: path None — встроенный шрифт pygame
+    font = pygame.font.Font(path, size)
+    if bold:
+        font.set_bold(True)
+    return font
+
+class FontCache:
+    def __init__(self, path=FONT_CACHE):
+        self.path = path
+        self.entries = {}       # "имя|жирный" -> [путь или None, дорисовать жирность]
+        self.changed = False
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def get(self, name, size, bold=False):
+        key = f"{name}|{int(bold)}"
+        entry = self.entries.get(key)
+        if entry is None or (entry[0] is not None and not os.path.exists(entry[0])):
+            # SysFont сам выбирает файл и стиль; конструктор только записывает выбор
+            entry = pygame.font.SysFont(name, size, bold, constructor=lambda p, s, b, i: [p, b])
+            self.entries[key] = entry
+            self.changed = True
+        return make_font(entry[0], size, entry[1])
+
+    def save(self):
+        if not self.changed:
+            return
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, self.path)
+            self.changed = False
+        except OSError:
+            pass    # нет прав на запись — в следующий раз просто снова спросим систему
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+import pygame
+from config import TILE, FOV_RADIUS, LIGHT_DARK
+from mapgen import world_to_tile
+
+# Рекурсивный shadowcasting по 8 октантам: (xx, xy, yx, yy) переводят
+# локальные координаты октанта в смещения карты
+OCTANTS = (
+    (1, 0, 0, 1), (0, 1, 1, 0), (0, -1, 1, 0), (-1, 0, 0, 1),
+    (-1, 0, 0, -1), (0, -1, -1, 0), (0, 1, -1, 0), (1, 0, 0, -1),
+)
+
+def _cast(tiles, w, h, ox, oy, row, start, end, radius, xx, xy, yx, yy, visible):
+    data, off, stride = tiles.data, tiles.offset, tiles.stride
+    if start < end:
+        return
+    r2 = radius * radius
+    new_start = start
+    for j in range(row, radius + 1):
+        dx, dy = -j - 1, -j
+        blocked = False
+        while dx <= 0:
+            dx += 1
+            l_slope = (dx - 0.5) / (dy + 0.5)
+            r_slope = (dx + 0.5) / (dy - 0.5)
+            if start < r_slope:
+                continue
+            if end > l_slope:
+                break
+            x = ox + dx * xx + dy * xy
+            y = oy + dx * yx + dy * yy
+            inside = 0 <= x < w and 0 <= y < h
+            if inside and dx * dx + dy * dy <= r2:
+                visible.add((x, y))
+            wall = not inside or data[off + y * stride + x] == 1
+            if blocked:
+                if wall:
+                    new_start = r_slope
+                    continue
+                blocked = False
+                start = new_start
+            elif wall and j < radius:
+                blocked = True
+                _cast(tiles, w, h, ox, oy, j + 1, start, l_slope, radius, xx, xy, yx, yy, visible)
+                new_start = r_slope
+        if blocked:
+            break
+
+def compute_fov(tiles, w, h, ox, oy, radius):
+    # Множество видимых из (ox, oy) тайлов в круге radius; стены видимы, но заслоняют
+    visible = {(ox, oy)}
+    for xx, xy, yx, yy in OCTANTS:
+        _cast(tiles, w, h, ox, oy, 1, 1.0, 0.0, radius, xx, xy, yx, yy, visible)
+    return visible
+
+class FieldOfView:
+    # Пересчитывается только при смене тайла игрока
+    def __init__(self, radius=FOV_RADIUS):
+        self.radius = radius
+        self.origin = None
+        self.visible = set()
+        self._mask = None
+
+    def reset(self):
+        self.origin = None
+        self.visible = set()
+        self._mask = None
+
+    def update(self, g):
+        # Возвращает тайлы, впервые попавшие в g.visited
+        tx, ty = world_to_tile(g.player.pos.x, g.player.pos.y)
+        if (tx, ty) == self.origin:
+            return []
+        self.origin = (tx, ty)
+        self.visible = compute_fov(g.tiles, g.MAP_W, g.MAP_H, tx, ty, self.radius)
+        self._mask = None
+        vis = g.visited
+        data, off, stride = vis.data, vis.offset, vis.stride
+        newly = [(x, y) for (x, y) in self.visible if not data[off + y * stride + x]]
+        for (x, y) in newly:
+            data[off + y * stride + x] = 1
+        return newly
+
+    def occlusion_mask(self):
+        # Маска тьмы для невидимых тайлов вокруг игрока: (Surface, мировая позиция).
+        # Строится в 1 пиксель на тайл и сглаженно растягивается до TILE
+        if self.origin is None:
+            return None
+        if self._mask is None:
+            r = self.radius
+            n = 2 * r + 1
+            ox, oy = self.origin
+            small = pygame.Surface((n, n), pygame.SRCALPHA)
+            small.fill((0, 0, 0, LIGHT_DARK))
+            for (x, y) in self.visible:
+                small.set_at((x - ox + r, y - oy + r), (0, 0, 0, 0))
+            big = pygame.transform.smoothscale(small, (n * TILE, n * TILE))
+            self._mask = (big, ((ox - r) * TILE, (oy - r) * TILE))
+        return self._mask
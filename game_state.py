@@ -3,14 +3,34 @@ import pygame
 import random
 from config import (
     SCREEN_W, SCREEN_H, TILE, COL_GOLD, STATE_MENU, STATE_PLAY, STATE_DEAD, STATE_WIN,
-    DIFFS, SIZES, TREASURE_TYPES
+    STATE_LOADING, DIFFS, SIZES, TREASURE_TYPES, PROJECTILE_CAP, FLOAT_TEXT_CAP
 )
-from mapgen import generate_new_floor
+from loader import FloorLoader, build_floor, install_floor
+from tilecache import TileCache
+from tilemap import TileMap
+from textcache import TextCache, CachedLayer
+from minimap import Minimap
+from sprites import SpriteAtlas
+from spatial import SpatialHash
+from particles import ParticlePool
+from input_source import PygameInput
+from controls import Controls
+from profiler import Profiler
+from lighting import LightingEngine
+from fov import FieldOfView
+from flowfield import FlowField
+from entities import Player, Projectile, FloatText, EntityPool, EnemyStore
 from systems import (
-    clamp_camera, add_particles, add_float_text, mark_visited_radius,
+    clamp_camera, add_particles, add_float_text, update_visited_by_player,
     update_particles, update_float_texts
 )
 
+def run_floor_seed(seed):
+    # Сид этажа забега: второе число ГСЧ забега (первое — частицам, см. start_run)
+    rng = random.Random(seed)
+    rng.getrandbits(64)
+    return rng.getrandbits(64)
+
 class Game:
     def __init__(self, screen, clock, font_small, font_mid, font_big):
         self.screen = screen
@@ -29,6 +49,24 @@ class Game:
             "lighting": True
         }
 
+        # Источник ввода (живой; headless подменяет на сценарий/бота) и его
+        # разбор в действия по раскладке
+        self.input = PygameInput()
+        self.controls = Controls()
+        self.profiler = Profiler()
+        self.recorder = None    # replay.InputRecorder при записи
+
+        # Сид забега и общий ГСЧ симуляции
+        self.seed = None
+        self.rng = random.Random()
+
+        # Фоновая генерация этажей: loading — (сид, FloorJob) на экране
+        # загрузки; при prefetch следующий забег (сид next_seed) строится заранее
+        self.loader = FloorLoader()
+        self.loading = None
+        self.prefetch = False
+        self.next_seed = None
+
         # Меню
         self.menu_items = []
         self.menu_sel = 0
@@ -37,6 +75,10 @@ class Game:
         self.cam = pygame.Vector2(0, 0)
         self.show_controls = False
         self.show_minimap = False
+        self.text = TextCache()
+        self.hud = CachedLayer()
+        self.minimap = Minimap()
+        self.sprites = SpriteAtlas()
 
         # Состояние игры
         self.state = STATE_MENU
@@ -45,40 +87,31 @@ class Game:
 
         # Мир
         self.MAP_W, self.MAP_H = self.settings["map_w"], self.settings["map_h"]
-        self.tiles = [[1 for _ in range(self.MAP_W)] for __ in range(self.MAP_H)]
-        self.visited = [[False for _ in range(self.MAP_W)] for __ in range(self.MAP_H)]
+        self.tiles = TileMap(self.MAP_W, self.MAP_H, fill=1)
+        self.visited = TileMap(self.MAP_W, self.MAP_H, fill=0, border=0)
         self.spawn_tx = self.spawn_ty = 0
         self.shop_rect = pygame.Rect(0, 0, TILE*6, TILE*4)
         self.exit_rect = None
         self.exit_open = False
         self.TARGET_GOLD = 500
+        self.tile_cache = TileCache()
+        self.world = None       # world.StreamingWorld в бесконечном режиме
+        self.lighting = LightingEngine()
+        self.fov = FieldOfView()
+        self.flow = FlowField()
 
         # Игрок
-        self.player = {
-            "pos": pygame.Vector2(0, 0),
-            "speed": 170.0,
-            "hp": 5,
-            "hp_max": 5,
-            "dash_cd": 0.0,
-            "dash_time": 0.0,
-            "dash_mult": 2.6,
-            "hurt_cd": 0.0,
-            "sell_cd": 0.0,
-            "dir": pygame.Vector2(1, 0),
-            "shoot_cd": 0.0,
-            "fire_rate": 0.22,
-            "proj_speed": 420.0,
-            "recoil": 12.0,
-        }
+        self.player = Player()
 
         # Объекты
         self.gold = 0
         self.inventory = []
-        self.enemies = []
+        self.enemies = EnemyStore()
         self.treasures = []
-        self.projectiles = []
-        self.particles = []
-        self.float_texts = []
+        self.treasure_grid = SpatialHash()
+        self.projectiles = EntityPool(Projectile, PROJECTILE_CAP)
+        self.particles = ParticlePool()
+        self.float_texts = EntityPool(FloatText, FLOAT_TEXT_CAP)
 
         # Инициализация меню
         self._build_menu()
@@ -119,44 +152,84 @@ class Game:
             {"name": "НАЧАТЬ ИГРУ", "get": lambda: "", "left": lambda: None, "right": lambda: None},
         ]
 
-    def new_run(self):
-        # Применить размер
-        self.MAP_W, self.MAP_H = self.settings["map_w"], self.settings["map_h"]
+    def _pick_seed(self, seed):
+        if seed is None:
+            seed, self.next_seed = self.next_seed, None
+        return seed if seed is not None else random.getrandbits(63)
+
+    def new_run(self, seed=None):
+        # Синхронно: этаж строится тут же, если не был заготовлен заранее
+        seed = self._pick_seed(seed)
+        job = self.loader.take(self.settings, run_floor_seed(seed))
+        floor = job.result() if job is not None else build_floor(self.settings, run_floor_seed(seed))
+        self.start_run(seed, floor)
+
+    def request_run(self, seed=None):
+        # Асинхронно: этаж строится в фоне, игра ждёт в STATE_LOADING (см. poll_loading)
+        seed = self._pick_seed(seed)
+        self.loading = (seed, self.loader.start(self.settings, run_floor_seed(seed)))
+        self.state = STATE_LOADING
+
+    def poll_loading(self):
+        seed, job = self.loading
+        if job.done():
+            self.loading = None
+            self.start_run(seed, job.result())
+
+    def prefetch_next(self):
+        # Заготовить этаж следующего забега под текущие настройки
+        self.next_seed = random.getrandbits(63)
+        self.loader.prefetch(self.settings, run_floor_seed(self.next_seed))
+
+    def start_run(self, seed, floor):
+        # Сид: весь забег (этаж, ИИ, частицы) воспроизводим по нему и логу ввода
+        self.seed = seed
+        self.rng = random.Random(self.seed)
+        self.particles.reseed(self.rng.getrandbits(64))
+        self.rng.getrandbits(64)    # сид этажа, см. run_floor_seed
 
         # Сброс объектов
-        self.enemies.clear()
-        self.treasures.clear()
         self.projectiles.clear()
         self.particles.clear()
         self.float_texts.clear()
+        self.controls.flush()
         self.gold = 0
         self.inventory.clear()
         self.game_over = False
         self.win = False
         self.exit_open = False
 
-        # Генерация мира и объектов
-        generate_new_floor(self)
+        # Готовый этаж: тайлы, объекты, мир бесконечного режима
+        if self.world is not None:
+            self.world.close()
+        install_floor(self, floor)
 
         # Игрок и камеры
-        diff = DIFFS[self.settings["difficulty"]]
-        self.player["hp_max"] = diff["player_hp"]
-        self.player["hp"] = self.player["hp_max"]
-        self.player["dash_cd"] = 0.0
-        self.player["dash_time"] = 0.0
-        self.player["hurt_cd"] = 0.0
-        self.player["sell_cd"] = 0.0
-        self.player["shoot_cd"] = 0.0
-        self.player["fire_rate"] = diff.get("player_fire_rate", self.player["fire_rate"])  # применяем баланс сложности
-        self.player["dir"] = pygame.Vector2(1, 0)
-        self.player["pos"] = pygame.Vector2(self.spawn_tx*TILE + TILE/2, self.spawn_ty*TILE + TILE/2)
+        diff = DIFFS[floor.settings["difficulty"]]
+        self.player.hp_max = diff["player_hp"]
+        self.player.hp = self.player.hp_max
+        self.player.dash_cd = 0.0
+        self.player.dash_time = 0.0
+        self.player.hurt_cd = 0.0
+        self.player.sell_cd = 0.0
+        self.player.shoot_cd = 0.0
+        self.player.fire_rate = diff.get("player_fire_rate", self.player.fire_rate)  # применяем баланс сложности
+        self.player.dir = pygame.Vector2(1, 0)
+        self.player.pos = pygame.Vector2(self.spawn_tx*TILE + TILE/2, self.spawn_ty*TILE + TILE/2)
 
         # Туман у старта
-        self.visited = [[False for _ in range(self.MAP_W)] for __ in range(self.MAP_H)]
-        mark_visited_radius(self, self.spawn_tx, self.spawn_ty, 2)
+        self.visited = TileMap(self.MAP_W, self.MAP_H, fill=0, border=0)
+        self.minimap.reset(self)
+        self.fov.reset()
+        update_visited_by_player(self)
+        self.flow.reset()
 
         clamp_camera(self)
         self.state = STATE_PLAY
+        if self.recorder is not None:
+            self.recorder.start_run(self)
+        if self.prefetch:
+            self.prefetch_next()
 
     def missing_gold(self):
         return max(0, self.TARGET_GOLD - self.gold)
@@ -164,5 +237,5 @@ class Game:
     def open_exit_if_ready(self):
         if not self.exit_open and self.gold >= self.TARGET_GOLD:
             self.exit_open = True
-            add_particles(self, self.player["pos"], COL_GOLD, n=24, speed=150)
-            add_float_text(self, "Выход открыт!", self.player["pos"]) 
+            add_particles(self, self.player.pos, COL_GOLD, n=24, speed=150)
+            add_float_text(self, "Выход открыт!", self.player.pos) 
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# Headless-прогон: SDL dummy-драйвер, фиксированный dt, без ограничения FPS.
+#   python headless.py --runs 100 --size Большой --difficulty Сложная
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import time
+import pygame
+from config import SCREEN_W, SCREEN_H, SIM_DT, STATE_PLAY, SIZES, DIFFS
+from game_state import Game
+from input_source import RandomInput, BotInput
+from systems import update_play
+from render import draw_world, draw_lighting, draw_ui
+from replay import InputRecorder
+
+def make_game(settings=None, input_source=None, size=(SCREEN_W, SCREEN_H)):
+    pygame.display.init()
+    pygame.font.init()
+    screen = pygame.display.set_mode(size)
+    font_small = pygame.font.Font(None, 18)
+    font_mid = pygame.font.Font(None, 24)
+    font_big = pygame.font.Font(None, 36)
+    g = Game(screen, None, font_small, font_mid, font_big)
+    if settings:
+        g.settings.update(settings)
+    if input_source is not None:
+        g.input = input_source
+    return g
+
+def set_size(g, size_name):
+    for n, w, h in SIZES:
+        if n == size_name:
+            g.settings.update(size_name=n, map_w=w, map_h=h)
+            return
+    raise ValueError(f"неизвестный размер: {size_name}")
+
+def run_headless(g, max_frames=60*60*10, dt=SIM_DT, render=False, seed=None):
+    # Один забег от new_run до смерти/победы/лимита кадров; сид задаёт весь забег
+    g.new_run(seed)
+    frames = 0
+    t0 = time.perf_counter()
+    prof = g.profiler
+    while g.state == STATE_PLAY and frames < max_frames:
+        prof.begin_frame()
+        g.controls.dispatch(g.input.poll(g), "play")
+        update_play(g, dt)
+        if render:
+            prof.run("draw_world", draw_world, g)
+            prof.run("draw_lighting", draw_lighting, g)
+            prof.run("draw_ui", draw_ui, g)
+        prof.end_frame(g)
+        frames += 1
+    wall = time.perf_counter() - t0
+    if g.recorder is not None and g.state == STATE_PLAY:
+        g.recorder.end_run(g)
+    return {
+        "result": g.state if g.state != STATE_PLAY else "timeout",
+        "frames": frames,
+        "sim_time": frames * dt,
+        "wall_time": wall,
+        "gold": g.gold,
+        "hp": g.player.hp,
+        "enemies_left": len(g.enemies),
+        "seed": g.seed,
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description="Headless-прогоны Treasure Dungeons")
+    ap.add_argument("--runs", type=int, default=10)
+    ap.add_argument("--frames", type=int, default=60*60*10, help="лимит кадров на забег")
+    ap.add_argument("--size", default="Средний", choices=[n for n, _, _ in SIZES])
+    ap.add_argument("--difficulty", default="Нормальная", choices=list(DIFFS))
+    ap.add_argument("--seed", type=int, default=None)
+    ap.add_argument("--render", action="store_true", help="рисовать кадры в dummy-поверхность")
+    ap.add_argument("--profile", default=None, help="выгрузить профиль кадров (.csv или .json)")
+    ap.add_argument("--record", default=None, help="записать ввод забегов для replay.py")
+    ap.add_argument("--bot", action="store_true", help="играет BotInput вместо случайного ввода")
+    args = ap.parse_args()
+
+    g = make_game({"difficulty": args.difficulty})
+    set_size(g, args.size)
+    if args.record:
+        g.recorder = InputRecorder(args.record)
+    total_frames = 0
+    t0 = time.perf_counter()
+    for i in range(args.runs):
+        seed = None if args.seed is None else args.seed + i
+        g.input = BotInput() if args.bot else RandomInput(seed)
+        stats = run_headless(g, args.frames, render=args.render, seed=seed)
+        total_frames += stats["frames"]
+        print(f"#{i}: сид={stats['seed']} {stats['result']:<7} кадров={stats['frames']:<6} золото={stats['gold']:<5} "
+              f"hp={stats['hp']} {stats['frames'] / max(stats['wall_time'], 1e-9):.0f} кадр/с")
+    wall = time.perf_counter() - t0
+    if g.recorder is not None:
+        g.recorder.close()
+    if args.profile:
+        if args.profile.endswith(".csv"):
+            g.profiler.dump_csv(args.profile)
+        else:
+            g.profiler.dump_json(args.profile)
+    print(f"Итого: {args.runs} забегов, {total_frames} кадров за {wall:.2f} с ({total_frames / max(wall, 1e-9):.0f} кадр/с)")
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+import random
+from collections import deque
+import numpy as np
+import pygame
+from config import TILE, TREASURE_TYPES, DIFFS
+from mapgen import world_to_tile
+
+# Источники ввода. Игра не опрашивает pygame напрямую: g.input.poll(g) отдаёт
+# события кадра, их разбирает по раскладке g.controls (controls.py).
+# Синтетические источники ведут себя как клавиатура с мышью — шлют
+# KEYDOWN/KEYUP при смене нажатых клавиш и MOUSEMOTION при смене курсора;
+# бот и реплей подают действия в g.controls напрямую, мимо раскладки.
+
+def key_events(old, new):
+    # События перехода от набора нажатых клавиш old к new
+    return ([pygame.event.Event(pygame.KEYUP, key=k) for k in sorted(old - new)] +
+            [pygame.event.Event(pygame.KEYDOWN, key=k) for k in sorted(new - old)])
+
+def motion_event(pos):
+    return pygame.event.Event(pygame.MOUSEMOTION, pos=pos)
+
+class PygameInput:
+    # Живой ввод с окна
+    def poll(self, g):
+        return pygame.event.get()
+
+class ScriptedInput:
+    # Покадровый сценарий: элемент — (нажатые клавиши, позиция мыши, события).
+    # После конца сценария ввод «отпускается».
+    def __init__(self, frames):
+        self.frames = iter(frames)
+        self.keys = set()
+        self.mouse = (0, 0)
+
+    def poll(self, g):
+        frame = next(self.frames, None)
+        if frame is None:
+            events, self.keys = key_events(self.keys, set()), set()
+            return events
+        keys, mouse, extra = frame
+        events = key_events(self.keys, set(keys))
+        self.keys = set(keys)
+        if mouse != self.mouse:
+            self.mouse = mouse
+            events.append(motion_event(mouse))
+        return events + list(extra)
+
+class RandomInput:
+    # Случайное блуждание со стрельбой — для soak-тестов
+    MOVE_KEYS = (pygame.K_w, pygame.K_a, pygame.K_s, pygame.K_d)
+
+    def __init__(self, seed=None, fire_chance=0.08, dash_chance=0.01, turn_chance=0.03):
+        self.rng = random.Random(seed)
+        self.fire_chance = fire_chance
+        self.dash_chance = dash_chance
+        self.turn_chance = turn_chance
+        self.keys = set()
+        self.mouse = (0, 0)
+
+    def poll(self, g):
+        rng = self.rng
+        events = []
+        if rng.random() < self.turn_chance or not self.keys:
+            keys = {k for k in self.MOVE_KEYS if rng.random() < 0.35}
+            events += key_events(self.keys, keys)
+            self.keys = keys
+        if rng.random() < self.fire_chance:
+            W, H = g.screen.get_size()
+            self.mouse = (rng.randrange(W), rng.randrange(H))
+            events.append(motion_event(self.mouse))
+            events.append(pygame.event.Event(pygame.MOUSEBUTTONDOWN, button=1, pos=self.mouse))
+        if rng.random() < self.dash_chance:
+            events.append(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_LSHIFT))
+        if g.inventory and g.shop_rect.collidepoint(g.player.pos.x, g.player.pos.y):
+            events.append(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_e))
+        return events
+
+class BotInput:
+    # Скриптовый бот для прогонов баланса: собирает ближайшие сокровища,
+    # несёт их в магазин, когда продажи хватит на цель (или руки полны,
+    # или здоровья мало), идёт в открытый выход. Путь обходит врагов; видимых
+    # врагов расстреливает, а подошедших ближе kite — держит на расстоянии,
+    # отходя от них (игрок быстрее), и уклоняется от летящих в него плевков.
+    # Когда сокровищ не осталось, охотится на врагов: с них падает добыча.
+    # Если stall тиков не продвигается к цели — отмечает себя застрявшим
+    # (stalled): это сбой бота, а не итог баланса.
+    # Решает только по состоянию g, так что забег с ботом воспроизводим по сиду.
+    # Действует мимо раскладки: удержание и действия — прямо в g.controls.
+    DIRS = [pygame.Vector2(1, 0).rotate(a) for a in range(0, 360, 45)]
+
+    def __init__(self, replan=15, shoot_range=260, carry=10, kite=110, stall=600):
+        self.replan = replan
+        self.shoot_range = shoot_range
+        self.carry = carry
+        self.kite = kite
+        self.stall = stall
+        self.path = []
+        self.ticks = 0
+        self.next_plan = 0
+        self.score = None       # что меняется при продвижении: золото, добыча, враги
+        self.best = None        # (длина пути, тик) — ближе всего к цели с последнего продвижения
+        self.stalled = False
+
+    def goals(self, g):
+        # Тайлы-цели по приоритету: открытый выход, магазин, сокровища
+        if g.exit_open and g.exit_rect:
+            return rect_tiles(g.exit_rect)
+        if g.inventory:
+            value = sum(TREASURE_TYPES[it.type]["value"] for it in g.inventory)
+            value = int(value * DIFFS[g.settings["difficulty"]]["sell_mult"])
+            if (g.gold + value >= g.TARGET_GOLD or len(g.inventory) >= self.carry
+                    or g.player.hp <= 2 or not g.treasures):
+                return rect_tiles(g.shop_rect)
+        if g.treasures:
+            return {world_to_tile(it.pos.x, it.pos.y) for it in g.treasures}
+        return self.enemy_tiles(g)
+
+    def enemy_tiles(self, g):
+        en = g.enemies
+        return set(zip(np.floor_divide(en.x[:en.n], TILE).astype(int).tolist(),
+                       np.floor_divide(en.y[:en.n], TILE).astype(int).tolist()))
+
+    def plan(self, g):
+        # BFS от тайла игрока до ближайшей цели; path — тайлы пути без стартового.
+        # Тайлы врагов и соседние с ними — стены, пока есть путь в обход
+        start = world_to_tile(g.player.pos.x, g.player.pos.y)
+        goals = self.goals(g)
+        self.path = []
+        if not goals:
+            return
+        if start in goals:
+            # Дойти до центра: добыча с врагов лежит не по центру тайла,
+            # а от центра до любой точки тайла не дальше радиуса подбора
+            self.path = [start]
+            return
+        near = {(x + dx, y + dy) for x, y in self.enemy_tiles(g)
+                for dx in (-1, 0, 1) for dy in (-1, 0, 1)}
+        near -= goals
+        near.discard(start)
+        self.path = bfs(g, start, goals, near) or bfs(g, start, goals, ()) or []
+
+    def steer(self, g):
+        # Вектор уклонения: прочь от близких видимых врагов и поперёк
+        # траекторий плевков, летящих в игрока; нулевой — опасности нет
+        p = g.player.pos
+        away = pygame.Vector2()
+        en = g.enemies
+        visible = g.fov.visible
+        for i in en.query_radius(p.x, p.y, self.kite):
+            if (int(en.x[i] // TILE), int(en.y[i] // TILE)) in visible:
+                d = pygame.Vector2(p.x - en.x[i], p.y - en.y[i])
+                if d.length_squared() > 0:
+                    away += d.normalize() * (self.kite / max(d.length(), 1.0))
+        for pr in g.projectiles:
+            if not pr.from_enemy:
+                continue
+            rel = p - pr.pos
+            v2 = pr.vel.length_squared()
+            t = rel.dot(pr.vel) / v2 if v2 else -1.0
+            if 0 < t < 0.6:
+                miss = rel - pr.vel * t
+                if miss.length_squared() < 22 * 22:
+                    side = miss if miss.length_squared() > 0 else pygame.Vector2(-pr.vel.y, pr.vel.x)
+                    away += side.normalize() * 3
+        return away
+
+    def poll(self, g):
+        p = g.player.pos
+        # Путь пересчитывается раз в replan тиков и сразу по приходе к цели;
+        # недостижимая цель не гоняет BFS по всей карте каждый тик
+        if self.ticks >= self.next_plan:
+            self.plan(g)
+            self.next_plan = self.ticks + self.replan
+            score = (g.gold, len(g.inventory), len(g.treasures), len(g.enemies))
+            if score != self.score:
+                self.score, self.best = score, None
+            if self.best is None or len(self.path) < self.best[0]:
+                self.best = (len(self.path), self.ticks)
+            elif self.ticks - self.best[1] > self.stall:
+                self.stalled = True
+        self.ticks += 1
+        c = g.controls
+
+        # Движение к центру следующего тайла пути; по обеим осям сразу,
+        # иначе пробы коллизии цепляют угол стены и игрок застревает
+        move = pygame.Vector2()
+        while self.path:
+            tx, ty = self.path[0]
+            move.update(tx * TILE + TILE / 2 - p.x, ty * TILE + TILE / 2 - p.y)
+            if abs(move.x) > 4 or abs(move.y) > 4:
+                break
+            self.path.pop(0)
+            if not self.path:
+                self.next_plan = self.ticks
+        if not self.path:
+            move.update(0, 0)
+
+        # Угроза рядом — отход по свободному из восьми направлений,
+        # ближайшему к вектору уклонения (с поправкой на путь)
+        away = self.steer(g)
+        if away.length_squared() > 0.25:
+            if move.length_squared() > 0:
+                move.scale_to_length(0.3)
+            wall_at = g.tiles.wall_at
+            free = [d for d in self.DIRS if not wall_at(p.x + d.x * 18, p.y + d.y * 18)]
+            if free:
+                move = max(free, key=lambda d: d.dot(away) + d.dot(move))
+                if away.length() > 2.5 and g.player.dash_cd <= 0:
+                    c.push("dash")
+        c.held.clear()
+        if move.x > 1 or move.x > 0.38 * move.length(): c.held.add("right")
+        if move.x < -1 or move.x < -0.38 * move.length(): c.held.add("left")
+        if move.y > 1 or move.y > 0.38 * move.length(): c.held.add("down")
+        if move.y < -1 or move.y < -0.38 * move.length(): c.held.add("up")
+
+        if g.inventory and g.shop_rect.collidepoint(p.x, p.y) and g.player.sell_cd <= 0:
+            c.push("sell")
+
+        # Стрельба по ближайшему видимому врагу: за стеной снаряд пропадёт зря
+        if g.player.shoot_cd <= 0:
+            en = g.enemies
+            visible = g.fov.visible
+            hits = [i for i in en.query_radius(p.x, p.y, self.shoot_range)
+                    if (int(en.x[i] // TILE), int(en.y[i] // TILE)) in visible]
+            if hits:
+                i = min(hits, key=lambda i: (en.x[i] - p.x) ** 2 + (en.y[i] - p.y) ** 2)
+                c.aim = (int(en.x[i] - g.cam.x), int(en.y[i] - g.cam.y))
+                c.push("fire")
+        return []
+
+def bfs(g, start, goals, blocked):
+    # Кратчайший путь по полу от start до любой из goals в обход blocked;
+    # -> тайлы пути без стартового или None
+    data, off, stride = g.tiles.data, g.tiles.offset, g.tiles.stride
+    parent = {start: None}
+    q = deque([start])
+    while q:
+        c = q.popleft()
+        if c in goals:
+            path = []
+            while c != start:
+                path.append(c)
+                c = parent[c]
+            path.reverse()
+            return path
+        x, y = c
+        for n in ((x+1, y), (x-1, y), (x, y+1), (x, y-1)):
+            if n not in parent and n not in blocked and data[off + n[1] * stride + n[0]] == 0:
+                parent[n] = c
+                q.append(n)
+    return None
+
+def rect_tiles(rect):
+    return {(tx, ty) for tx in range(rect.left // TILE, (rect.right - 1) // TILE + 1)
+            for ty in range(rect.top // TILE, (rect.bottom - 1) // TILE + 1)}
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pygame
+from config import LIGHT_DARK, LIGHT_AMBIENT
+
+def bake_light_mask(radius, soft):
+    # Радиальная маска тьмы: LIGHT_AMBIENT внутри radius, плавный рост
+    # до LIGHT_DARK на кольце шириной soft, снаружи — полная тьма
+    size = int(radius + soft) * 2
+    surf = pygame.Surface((size, size), pygame.SRCALPHA)
+    surf.fill((0, 0, 0, LIGHT_DARK))
+    c = (size - 1) / 2
+    xs = np.arange(size, dtype=np.float32) - c
+    d = np.sqrt(xs[:, None] ** 2 + xs[None, :] ** 2)
+    k = np.clip((d - radius) / max(soft, 1), 0.0, 1.0)
+    alpha = pygame.surfarray.pixels_alpha(surf)
+    alpha[:] = (LIGHT_AMBIENT + k * (LIGHT_DARK - LIGHT_AMBIENT)).astype(np.uint8)
+    del alpha
+    return surf
+
+class LightingEngine:
+    # Слой тьмы переиспользуется между кадрами; маски источников
+    # запекаются один раз на (radius, soft) и кладутся по BLEND_RGBA_MIN,
+    # так что перекрывающиеся источники дают объединение света.
+    def __init__(self):
+        self.dark = None
+        self.masks = {}
+
+    def mask(self, radius, soft):
+        key = (radius, soft)
+        m = self.masks.get(key)
+        if m is None:
+            m = self.masks[key] = bake_light_mask(radius, soft)
+        return m
+
+    def stamp(self, light):
+        # light: (экранный x, экранный y, radius, soft)
+        x, y, radius, soft = light
+        W, H = self.dark.get_size()
+        half = radius + soft
+        if x + half < 0 or y + half < 0 or x - half > W or y - half > H:
+            return
+        m = self.mask(radius, soft)
+        self.dark.blit(m, (int(x) - m.get_width() // 2, int(y) - m.get_height() // 2),
+                       special_flags=pygame.BLEND_RGBA_MIN)
+
+    def render(self, screen, player, lights, occluder=None):
+        # player — свет игрока, lights — остальные источники, тот же формат;
+        # occluder — (Surface, экранная позиция) тьмы за стенами, затемняет
+        # только свет игрока: кладётся после него и до остальных
+        if self.dark is None or self.dark.get_size() != screen.get_size():
+            self.dark = pygame.Surface(screen.get_size(), pygame.SRCALPHA)
+        self.dark.fill((0, 0, 0, LIGHT_DARK))
+        self.stamp(player)
+        if occluder is not None:
+            self.dark.blit(occluder[0], occluder[1], special_flags=pygame.BLEND_RGBA_MAX)
+        for light in lights:
+            self.stamp(light)
+        screen.blit(self.dark, (0, 0))
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+# Генерация этажей вне главного потока. build_floor строит этаж как чистые
+# данные (Floor: TileMap, векторы, массивы врагов — без поверхностей pygame
+# и без ссылок на Game) и поэтому может идти в фоновом потоке; готовый этаж
+# ставится в игру install_floor уже на главном. FloorLoader держит один
+# этаж «на вырост»: следующий забег строится, пока игрок проходит текущий.
+import threading
+import pygame
+from config import TILE, ENDLESS_SIZE
+from entities import EnemyStore
+from mapgen import generate_new_floor
+from world import StreamingWorld
+
+# Настройки, от которых зависит этаж (освещение — нет)
+FLOOR_KEYS = ("size_name", "map_w", "map_h", "difficulty", "treasure_density")
+
+def floor_key(settings, seed):
+    return tuple(settings[k] for k in FLOOR_KEYS) + (seed,)
+
+class Floor:
+    # Атрибуты названы как у Game, так что генераторы заполняют его как g
+    def __init__(self, settings):
+        self.settings = dict(settings)
+        self.MAP_W, self.MAP_H = settings["map_w"], settings["map_h"]
+        self.tiles = None
+        self.spawn_tx = self.spawn_ty = 0
+        self.shop_rect = pygame.Rect(0, 0, TILE*6, TILE*4)
+        self.exit_rect = None
+        self.TARGET_GOLD = 500
+        self.treasures = []
+        self.enemies = EnemyStore()
+        self.world = None
+
+def no_progress(frac, label):
+    pass
+
+def build_floor(settings, seed, progress=None):
+    # Этаж по настройкам и сиду; progress(доля 0..1, подпись) — ход генерации
+    progress = progress or no_progress
+    f = Floor(settings)
+    if settings["size_name"] == ENDLESS_SIZE:
+        f.world = StreamingWorld(seed)
+        f.world.generate(f, progress)
+    else:
+        generate_new_floor(f, seed, progress)
+    progress(1.0, "Готово")
+    return f
+
+def install_floor(g, f):
+    # Поставить готовый этаж в игру (только главный поток; этаж одноразовый)
+    g.MAP_W, g.MAP_H = f.MAP_W, f.MAP_H
+    g.tiles = f.tiles
+    g.spawn_tx, g.spawn_ty = f.spawn_tx, f.spawn_ty
+    g.shop_rect = f.shop_rect
+    g.exit_rect = f.exit_rect
+    g.TARGET_GOLD = f.TARGET_GOLD
+    g.treasures[:] = f.treasures
+    g.enemies = f.enemies
+    g.world = f.world
+    g.treasure_grid.rebuild(g.treasures)
+    g.tile_cache.invalidate()
+
+class FloorJob:
+    # Этаж, строящийся в фоновом потоке; progress и label читает экран загрузки
+    def __init__(self, settings, seed):
+        self.key = floor_key(settings, seed)
+        self.progress = 0.0
+        self.label = ""
+        self.floor = None
+        self.error = None
+        self.finished = threading.Event()
+        # daemon: выход из игры не ждёт недостроенный этаж
+        self.thread = threading.Thread(target=self._run, args=(dict(settings), seed),
+                                       name="floor-gen", daemon=True)
+        self.thread.start()
+
+    def _run(self, settings, seed):
+        try:
+            self.floor = build_floor(settings, seed, self.report)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished.set()
+
+    def report(self, frac, label):
+        self.progress = frac
+        self.label = label
+
+    def done(self):
+        return self.finished.is_set()
+
+    def result(self):
+        # Ждёт окончания; ошибка генерации всплывает здесь, в главном потоке
+        self.finished.wait()
+        if self.error is not None:
+            raise self.error
+        return self.floor
+
+class FloorLoader:
+    def __init__(self):
+        self.ahead = None   # FloorJob следующего забега
+
+    def prefetch(self, settings, seed):
+        # Прежний заготовленный этаж, если был, просто выбрасывается
+        self.ahead = FloorJob(settings, seed)
+
+    def take(self, settings, seed):
+        # Заготовленный этаж, если он для этих настроек и сида, иначе None
+        job, self.ahead = self.ahead, None
+        if job is not None and job.key == floor_key(settings, seed):
+            return job
+        return None
+
+    def start(self, settings, seed):
+        return self.take(settings, seed) or FloorJob(settings, seed)
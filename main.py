@@ -1,65 +1,135 @@
 # -*- coding: utf-8 -*-
+import argparse
+import os
+import struct
+import zlib
+from startup import StartupTimer    # первым: отсчёт старта включает импорты ниже
 import pygame
-from config import SCREEN_W, SCREEN_H, STATE_MENU, STATE_PLAY, STATE_DEAD, STATE_WIN
-from game_state import Game
-from systems import (
-    clamp_camera, update_particles, update_float_texts,
-    handle_input, pick_up_items, enemy_ai_and_collisions,
-    update_projectiles, update_visited_by_player, check_exit
+from config import (
+    SCREEN_W, SCREEN_H, SIM_DT, FPS, IDLE_FPS, STATE_MENU, STATE_PLAY, STATE_DEAD, STATE_WIN, STATE_LOADING,
+    QUICKSAVE, STARTUP_BUDGET_MS, KEYMAP_FILE, COL_RED
 )
+from game_state import Game
+from systems import update_play, add_float_text
+from fonts import FontCache
+from controls import CONTEXTS
+from dirtyrects import DirtyScreen
 from render import (
-    draw_world, draw_lighting, draw_ui,
-    draw_death_or_win_overlay, compute_death_win_button_rects
+    draw_world, draw_lighting, draw_ui, draw_loading,
+    draw_death_or_win_overlay, draw_death_win_button, compute_death_win_button_rects
 )
 
+# Не больше стольких шагов симуляции за кадр: после долгого подвисания
+# игра замедляется, а не пытается нагнать всё разом
+MAX_STEPS = 5
+
 def main():
-    pygame.init()
+    ap = argparse.ArgumentParser(description="Treasure Dungeons")
+    ap.add_argument("--record", default=None, help="записывать ввод забегов в файл (см. replay.py)")
+    ap.add_argument("--startup", action="store_true", help="напечатать замеры холодного старта по этапам")
+    args = ap.parse_args()
+    boot = StartupTimer()
+    boot.mark("импорты")
+
+    # Только нужные подсистемы SDL: звука и джойстиков в игре нет
+    pygame.display.init()
+    pygame.font.init()
     screen = pygame.display.set_mode((SCREEN_W, SCREEN_H))
     pygame.display.set_caption("Treasure Dungeons — многомодульная версия")
     clock = pygame.time.Clock()
+    boot.mark("окно")
 
-    font_small = pygame.font.SysFont("consolas", 18)
-    font_mid = pygame.font.SysFont("consolas", 24, bold=False)
-    font_big = pygame.font.SysFont("consolas", 36, bold=True)
+    fonts = FontCache()
+    font_small = fonts.get("consolas", 18)
+    font_mid = fonts.get("consolas", 24)
+    font_big = fonts.get("consolas", 36, bold=True)
+    fonts.save()
+    boot.mark("шрифты")
 
     game = Game(screen, clock, font_small, font_mid, font_big)
+    game.controls.load(KEYMAP_FILE)
+    if args.record:
+        from replay import InputRecorder
+        game.recorder = InputRecorder(args.record)
+    # Этажи строятся в фоне: первый — после первого кадра меню (поток генерации
+    # не отнимает время у старта), следующий — во время забега
+    game.prefetch = True
+    boot.mark("игра")
 
     running = True
     dt = 0.016
+    # Симуляция идёт фиксированными шагами SIM_DT независимо от FPS:
+    # это условие детерминизма записи. Действия ждут свой шаг в очереди g.controls.
+    acc = 0.0
+    # Окно обновляется по грязным областям; пока на экране ничего не
+    # меняется, цикл крутится на IDLE_FPS
+    dirty = DirtyScreen()
+    idle = False
 
     while running:
-        dt = clock.tick(60) / 1000.0
-        events = pygame.event.get()
-
-        # Общие события (выход)
-        for e in events:
-            if e.type == pygame.QUIT:
-                running = False
-            elif e.type == pygame.KEYDOWN and e.key == pygame.K_ESCAPE:
+        dt = clock.tick(IDLE_FPS if idle else FPS) / 1000.0
+        # События кадра разбираются один раз: игровые действия уходят в очередь
+        # шагов, глобальные и действия экрана — сюда
+        actions = game.controls.dispatch(game.input.poll(game), CONTEXTS.get(game.state))
+
+        # Глобальные действия
+        for a in actions:
+            if a == "quit":
                 running = False
+            elif a == "expose":
+                dirty.invalidate()
+            elif a == "profiler":
+                game.profiler.show = not game.profiler.show
+            elif a == "profile_dump":
+                game.profiler.dump_csv("profile.csv")
+                game.profiler.dump_json("profile.json")
+            elif a == "quicksave" and game.state == STATE_PLAY:
+                from savegame import save_game
+                try:
+                    save_game(game, QUICKSAVE)
+                    add_float_text(game, "Сохранено", game.player.pos)
+                except OSError:
+                    add_float_text(game, "Не удалось сохранить", game.player.pos, COL_RED)
+            elif (a == "quickload" and os.path.exists(QUICKSAVE)
+                  and game.state in (STATE_PLAY, STATE_DEAD, STATE_WIN)):
+                # Загруженный забег не пишется: лог воспроизводит забеги только от new_run.
+                # Битое сохранение не трогает текущий забег (load_game меняет g
+                # только после разбора всего файла) — остаётся сообщение
+                if game.recorder is not None:
+                    game.recorder.end_run(game)
+                from savegame import load_game
+                try:
+                    load_game(game, QUICKSAVE)
+                except (OSError, ValueError, KeyError, struct.error, zlib.error):
+                    add_float_text(game, "Сохранение повреждено", game.player.pos, COL_RED)
+                dirty.invalidate()
+
+        if game.state != STATE_PLAY:
+            acc = 0.0
+            game.controls.flush()
 
         # Состояние: меню
         if game.state == STATE_MENU:
-            for e in events:
-                if e.type == pygame.KEYDOWN:
-                    if e.key == pygame.K_UP:
-                        game.menu_sel = (game.menu_sel - 1) % len(game.menu_items)
-                    elif e.key == pygame.K_DOWN:
-                        game.menu_sel = (game.menu_sel + 1) % len(game.menu_items)
-                    elif e.key == pygame.K_LEFT:
-                        game.menu_items[game.menu_sel]["left"]()
-                    elif e.key == pygame.K_RIGHT:
-                        game.menu_items[game.menu_sel]["right"]()
-                    elif e.key == pygame.K_RETURN:
-                        game.new_run()
-
-            # Рендер меню
-            screen.fill((16, 18, 24))
-            title = font_big.render("Treasure Dungeons", True, (200, 230, 255))
-            screen.blit(title, (SCREEN_W//2 - title.get_width()//2, 80))
-
-            desc = font_mid.render("Выбери настройки и нажми Enter, чтобы начать", True, (140, 150, 160))
-            screen.blit(desc, (SCREEN_W//2 - desc.get_width()//2, 120))
+            for a in actions:
+                if a == "menu_up":
+                    game.menu_sel = (game.menu_sel - 1) % len(game.menu_items)
+                elif a == "menu_down":
+                    game.menu_sel = (game.menu_sel + 1) % len(game.menu_items)
+                elif a == "menu_left":
+                    game.menu_items[game.menu_sel]["left"]()
+                elif a == "menu_right":
+                    game.menu_items[game.menu_sel]["right"]()
+                elif a == "start":
+                    game.request_run()
+
+            # Рендер меню: фон и заголовок — при входе, дальше только изменившиеся строки
+            if dirty.begin(STATE_MENU):
+                screen.fill((16, 18, 24))
+                title = game.text.render(font_big, "Treasure Dungeons", (200, 230, 255))
+                screen.blit(title, (SCREEN_W//2 - title.get_width()//2, 80))
+
+                desc = game.text.render(font_mid, "Выбери настройки и нажми Enter, чтобы начать", (140, 150, 160))
+                screen.blit(desc, (SCREEN_W//2 - desc.get_width()//2, 120))
 
             base_y = 180
             for i, it in enumerate(game.menu_items):
@@ -67,65 +137,94 @@ def main():
                 name = it["name"]
                 val = it["get"]()
                 text = f"{name}: {val}" if val != "" else name
-                img = font_mid.render(text, True, (230, 235, 240) if is_sel else (140, 150, 160))
-                x = SCREEN_W//2 - img.get_width()//2
                 y = base_y + i * 40
+                row = pygame.Rect(0, y - 6, SCREEN_W, 40)
+                if not dirty.layer(("menu", i), (text, is_sel), row):
+                    continue
+                screen.fill((16, 18, 24), row)
+                img = game.text.render(font_mid, text, (230, 235, 240) if is_sel else (140, 150, 160))
+                x = SCREEN_W//2 - img.get_width()//2
                 if is_sel:
                     pygame.draw.rect(screen, (40, 70, 100), pygame.Rect(x-14, y-4, img.get_width()+28, img.get_height()+8), border_radius=8)
                 screen.blit(img, (x, y))
 
-            pygame.display.flip()
+            idle = not dirty.present()
+            if boot is not None:
+                boot.mark("первый кадр")
+                boot.report(STARTUP_BUDGET_MS, args.startup)
+                boot = None
+                if game.state == STATE_MENU:
+                    game.prefetch_next()
             continue
 
+        # Состояние: загрузка (события выше продолжают разбираться)
+        if game.state == STATE_LOADING:
+            game.poll_loading()
+            if game.state == STATE_LOADING:
+                job = game.loading[1]
+                if dirty.begin(STATE_LOADING) | dirty.layer("loading", (int(job.progress * 100), job.label), screen.get_rect()):
+                    draw_loading(game)
+                idle = not dirty.present()
+                continue
+
         # Состояние: игра
         if game.state == STATE_PLAY:
-            handle_input(game, dt, events)
-            update_visited_by_player(game)
-
-            clamp_camera(game)
-            pick_up_items(game)
-            enemy_ai_and_collisions(game, dt)
-            update_projectiles(game, dt)
-            update_particles(game, dt)
-            update_float_texts(game, dt)
-            check_exit(game)
-
-            if game.game_over:
-                game.state = STATE_DEAD
-            elif game.win:
-                game.state = STATE_WIN
-
-            draw_world(game)
-            draw_lighting(game)
-            draw_ui(game)
-            pygame.display.flip()
+            prof = game.profiler
+            prof.begin_frame()
+            acc = min(acc + dt, SIM_DT * MAX_STEPS)
+            while acc >= SIM_DT and game.state == STATE_PLAY:
+                update_play(game, SIM_DT)
+                acc -= SIM_DT
+
+            prof.run("draw_world", draw_world, game)
+            prof.run("draw_lighting", draw_lighting, game)
+            prof.run("draw_ui", draw_ui, game)
+            prof.draw(game)
+            prof.end_frame(game)
+            # Камера следует за игроком — меняется весь экран
+            dirty.begin(STATE_PLAY)
+            dirty.invalidate()
+            idle = not dirty.present()
             continue
 
         # Состояния: смерть / победа
         if game.state in (STATE_DEAD, STATE_WIN):
             buttons = compute_death_win_button_rects(game)
-            for e in events:
-                if e.type == pygame.KEYDOWN:
-                    if e.key == pygame.K_r:
-                        game.new_run()
-                    elif e.key == pygame.K_m:
-                        game.state = STATE_MENU
-                elif e.type == pygame.MOUSEBUTTONDOWN and e.button == 1:
-                    mx, my = pygame.mouse.get_pos()
+            for a in actions:
+                if a == "restart":
+                    game.request_run()
+                elif a == "to_menu":
+                    game.state = STATE_MENU
+                elif a == "click":
+                    mx, my = game.controls.aim
                     if buttons["restart"].collidepoint(mx, my):
-                        game.new_run()
+                        game.request_run()
                     elif buttons["menu"].collidepoint(mx, my):
                         game.state = STATE_MENU
-
-            draw_world(game)
-            draw_lighting(game)
-            if game.state == STATE_DEAD:
-                draw_death_or_win_overlay(game, "Ты пал…", buttons)
-            else:
-                draw_death_or_win_overlay(game, "Ты выбрался с сокровищами!", buttons)
-            pygame.display.flip()
+            if game.state not in (STATE_DEAD, STATE_WIN):
+                idle = False
+                continue
+
+            # Мир за оверлеем стоит: он рисуется один раз, дальше — только кнопки при наведении
+            if dirty.begin(game.state):
+                draw_world(game)
+                draw_lighting(game)
+                if game.state == STATE_DEAD:
+                    draw_death_or_win_overlay(game, "Ты пал…", buttons)
+                else:
+                    draw_death_or_win_overlay(game, "Ты выбрался с сокровищами!", buttons)
+            mx, my = game.controls.aim
+            for key, rect in buttons.items():
+                hovered = rect.collidepoint(mx, my)
+                if dirty.layer(key, hovered, rect):
+                    draw_death_win_button(game, key, rect, hovered)
+            idle = not dirty.present()
             continue
 
+    if game.recorder is not None:
+        if game.state == STATE_PLAY:
+            game.recorder.end_run(game)
+        game.recorder.close()
     pygame.quit()
 
 if __name__ == "__main__":
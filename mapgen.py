@@ -2,7 +2,10 @@
 import pygame
 import random
 import math
+import numpy as np
 from config import TILE, TREASURE_TYPES, DIFFS
+from tilemap import TileMap
+from entities import Treasure
 
 def in_bounds(g, tx, ty):
     return 0 <= tx < g.MAP_W and 0 <= ty < g.MAP_H
@@ -11,131 +14,154 @@ def world_to_tile(x, y):
     return int(x // TILE), int(y // TILE)
 
 def is_wall_at_world(g, x, y):
-    tx, ty = world_to_tile(x, y)
-    if not in_bounds(g, tx, ty): return True
-    return g.tiles[ty][tx] == 1
+    return g.tiles.wall_at(x, y)
 
 def collide_move(g, pos, move, radius=10):
-    new = pos + move
-    test = pygame.Vector2(new.x, pos.y)
-    if (is_wall_at_world(g, test.x - radius, test.y) or
-        is_wall_at_world(g, test.x + radius, test.y) or
-        is_wall_at_world(g, test.x, test.y - radius) or
-        is_wall_at_world(g, test.x, test.y + radius)):
-        test.x = pos.x
-    test2 = pygame.Vector2(test.x, new.y)
-    if (is_wall_at_world(g, test2.x - radius, test2.y) or
-        is_wall_at_world(g, test2.x + radius, test2.y) or
-        is_wall_at_world(g, test2.x, test2.y - radius) or
-        is_wall_at_world(g, test2.x, test2.y + radius)):
-        test2.y = pos.y
-    return test2
-
-def carve_random_walk(g, steps, rooms, room_size):
-    g.tiles = [[1 for _ in range(g.MAP_W)] for __ in range(g.MAP_H)]
-    cx, cy = g.MAP_W // 2, g.MAP_H // 2
+    wall = g.tiles.wall_at
+    x, y = pos.x, pos.y
+    nx, ny = x + move.x, y + move.y
+    if wall(nx - radius, y) or wall(nx + radius, y) or wall(nx, y - radius) or wall(nx, y + radius):
+        nx = x
+    if wall(nx - radius, ny) or wall(nx + radius, ny) or wall(nx, ny - radius) or wall(nx, ny + radius):
+        ny = y
+    return pygame.Vector2(nx, ny)
+
+def collide_move_many(tiles, xs, ys, mx, my, radius=10):
+    # collide_move для N точек сразу (массивы numpy); возвращает новые xs, ys
+    nx = xs + mx
+    hit = (tiles.walls_at(nx - radius, ys) | tiles.walls_at(nx + radius, ys) |
+           tiles.walls_at(nx, ys - radius) | tiles.walls_at(nx, ys + radius))
+    nx = np.where(hit, xs, nx)
+    ny = ys + my
+    hit = (tiles.walls_at(nx - radius, ny) | tiles.walls_at(nx + radius, ny) |
+           tiles.walls_at(nx, ny - radius) | tiles.walls_at(nx, ny + radius))
+    ny = np.where(hit, ys, ny)
+    return nx, ny
+
+# Единичные шаги случайного блуждания
+WALK_DX = np.array([1, -1, 0, 0], np.int64)
+WALK_DY = np.array([0, 0, 1, -1], np.int64)
+WALK_BATCH = 4096
+
+def tile_array(g):
+    # Карта как массив (MAP_H, MAP_W) uint8 без копии: 0 — пол, 1 — стена
+    return g.tiles.view
+
+def random_walk(rng, x, y, steps, x0, x1, y0, y1):
+    # Блуждание из (x, y), зажатое в [x0, x1]×[y0, y1]; возвращает все посещённые точки.
+    # Шаги идут пачками через cumsum; пачка обрывается на первом упоре в границу,
+    # этот шаг (как и при поштучном clamp) оставляет точку на месте.
+    d = rng.integers(0, 4, steps)
+    dx, dy = WALK_DX[d], WALK_DY[d]
+    xs, ys = [np.array([x])], [np.array([y])]
+    i = 0
+    while i < steps:
+        j = min(steps, i + WALK_BATCH)
+        px = x + np.cumsum(dx[i:j])
+        py = y + np.cumsum(dy[i:j])
+        out = (px < x0) | (px > x1) | (py < y0) | (py > y1)
+        k = int(out.argmax()) if out.any() else j - i
+        if k:
+            xs.append(px[:k]); ys.append(py[:k])
+            x, y = int(px[k-1]), int(py[k-1])
+        i += k
+        if i < j:
+            i += 1   # шаг в стену границы — стоим на месте
+    return np.concatenate(xs), np.concatenate(ys)
+
+def smooth_walls(grid, passes=2):
+    # Клетка внутри карты становится полом, если в её окрестности 3×3 не больше 3 стен
+    H, W = grid.shape
+    for _ in range(passes):
+        n = np.zeros((H - 2, W - 2), np.uint8)
+        for dy in (0, 1, 2):
+            for dx in (0, 1, 2):
+                n += grid[dy:dy + H - 2, dx:dx + W - 2]
+        grid[1:-1, 1:-1][n <= 3] = 0
+
+def carve_random_walk(g, steps, rooms, room_size, rng):
+    W, H = g.MAP_W, g.MAP_H
+    g.tiles = TileMap(W, H, fill=1)
+    grid = g.tiles.view
+    cx, cy = W // 2, H // 2
 
     # Комнаты
-    for _ in range(rooms):
-        rw = random.randint(room_size, room_size + 5)
-        rh = random.randint(room_size, room_size + 5)
-        rx = max(2, min(g.MAP_W - rw - 2, cx + random.randint(-12, 12)))
-        ry = max(2, min(g.MAP_H - rh - 2, cy + random.randint(-8, 8)))
-        for yy in range(ry, ry + rh):
-            for xx in range(rx, rx + rw):
-                g.tiles[yy][xx] = 0
-
-    x, y = cx, cy
-    for _ in range(steps):
-        g.tiles[y][x] = 0
-        dir = random.choice([(1,0), (-1,0), (0,1), (0,-1)])
-        x = max(1, min(g.MAP_W - 2, x + dir[0]))
-        y = max(1, min(g.MAP_H - 2, y + dir[1]))
-        g.tiles[y][x] = 0
+    rw = rng.integers(room_size, room_size + 6, rooms)
+    rh = rng.integers(room_size, room_size + 6, rooms)
+    rx = np.maximum(2, np.minimum(W - rw - 2, cx + rng.integers(-12, 13, rooms)))
+    ry = np.maximum(2, np.minimum(H - rh - 2, cy + rng.integers(-8, 9, rooms)))
+    for x, y, w, h in zip(rx.tolist(), ry.tolist(), rw.tolist(), rh.tolist()):
+        grid[y:y + h, x:x + w] = 0
+
+    xs, ys = random_walk(rng, cx, cy, steps, 1, W - 2, 1, H - 2)
+    grid[ys, xs] = 0
 
     # Сглаживание
-    for _ in range(2):
-        for yy in range(1, g.MAP_H - 1):
-            for xx in range(1, g.MAP_W - 1):
-                n = 0
-                for dy in (-1,0,1):
-                    for dx in (-1,0,1):
-                        if g.tiles[yy+dy][xx+dx] == 1:
-                            n += 1
-                if n <= 3:
-                    g.tiles[yy][xx] = 0
+    smooth_walls(grid)
 
     # Стартовая комната
-    for sy in range(cy - 4, cy + 5):
-        for sx in range(cx - 5, cx + 6):
-            if in_bounds(g, sx, sy):
-                g.tiles[sy][sx] = 0
+    grid[max(0, cy - 4):cy + 5, max(0, cx - 5):cx + 6] = 0
 
     # Магазин у спавна
     g.shop_rect.x = (cx - 3) * TILE
     g.shop_rect.y = (cy - 2) * TILE
     return cx, cy
 
-def spawn_treasures_by_density(g, density):
+def spawn_treasures_by_density(g, density, rng):
     g.treasures.clear()
-    floor_tiles = [(tx, ty) for ty in range(g.MAP_H) for tx in range(g.MAP_W) if g.tiles[ty][tx] == 0]
-    random.shuffle(floor_tiles)
-    num = int(len(floor_tiles) * density)
-    weights = [t["weight"] for t in TREASURE_TYPES]
-    i = 0
-    for (tx, ty) in floor_tiles:
-        if i >= num: break
-        if (abs(tx - g.spawn_tx) + abs(ty - g.spawn_ty)) <= 6:
-            continue
-        g.treasures.append({
-            "pos": pygame.Vector2(tx * TILE + TILE / 2, ty * TILE + TILE / 2),
-            "type": random.choices(range(len(TREASURE_TYPES)), weights=weights)[0]
-        })
-        i += 1
-
-def spawn_enemies_scaled(g, base_num, diff):
+    floor = tile_array(g) == 0
+    num = int(floor.sum() * density)
+    ys, xs = np.nonzero(floor)
+    far = (np.abs(xs - g.spawn_tx) + np.abs(ys - g.spawn_ty)) > 6
+    xs, ys = xs[far], ys[far]
+    pick = rng.choice(len(xs), size=min(num, len(xs)), replace=False)
+    weights = np.array([t["weight"] for t in TREASURE_TYPES], np.float64)
+    types = rng.choice(len(TREASURE_TYPES), size=len(pick), p=weights / weights.sum())
+    for tx, ty, kind in zip(xs[pick].tolist(), ys[pick].tolist(), types.tolist()):
+        g.treasures.append(Treasure(pygame.Vector2(tx * TILE + TILE / 2, ty * TILE + TILE / 2), kind))
+
+def spawn_enemies_scaled(g, base_num, diff, rng):
     g.enemies.clear()
     target_num = max(4, int(base_num * diff["enemy_mult"]))
-    tries = 0
-    while len(g.enemies) < target_num and tries < target_num * 200:
-        tries += 1
-        tx = random.randrange(2, g.MAP_W - 2)
-        ty = random.randrange(2, g.MAP_H - 2)
-        if g.tiles[ty][tx] == 0:
-            if (abs(tx - g.spawn_tx) + abs(ty - g.spawn_ty)) > 8:
-                kind = "chaser"
-                if random.random() < diff["spitter_chance"]:
-                    kind = "spitter"
-                g.enemies.append({
-                    "pos": pygame.Vector2(tx * TILE + TILE / 2, ty * TILE + TILE / 2),
-                    "hp": 3 if kind == "chaser" else 2,
-                    "t": random.random() * 10.0,
-                    "kind": kind,
-                    "state": "wander",
-                    "atk_cd": random.uniform(0.0, 1.2),
-                })
-
-def spawn_exit_far(g):
+    # Равновероятно по тайлам пола в рамке [2, MAP-3], дальше 8 от спавна
+    floor = tile_array(g)[2:g.MAP_H - 2, 2:g.MAP_W - 2] == 0
+    ys, xs = np.nonzero(floor)
+    xs, ys = xs + 2, ys + 2
+    far = (np.abs(xs - g.spawn_tx) + np.abs(ys - g.spawn_ty)) > 8
+    xs, ys = xs[far], ys[far]
+    if len(xs) > 0:
+        pick = rng.integers(0, len(xs), target_num)
+        spit = rng.random(target_num) < diff["spitter_chance"]
+        ts = rng.random(target_num) * 10.0
+        cds = rng.uniform(0.0, 1.2, target_num)
+        g.enemies.add_many(xs[pick] * TILE + TILE / 2, ys[pick] * TILE + TILE / 2, spit, ts, cds)
+
+def spawn_exit_far(g, rng):
+    # Самый дальний от спавна тайл пола среди 1200 случайных проб
     g.exit_rect = None
-    best = None
-    best_d = -1
-    for _ in range(1200):
-        tx = random.randrange(1, g.MAP_W - 1)
-        ty = random.randrange(1, g.MAP_H - 1)
-        if g.tiles[ty][tx] == 0:
-            d = abs(tx - g.spawn_tx) + abs(ty - g.spawn_ty)
-            if d > best_d:
-                best_d = d
-                best = (tx, ty)
-    if best:
-        g.exit_rect = pygame.Rect(best[0] * TILE, best[1] * TILE, TILE * 2, TILE * 2)
-
-def generate_new_floor(g):
+    txs = rng.integers(1, g.MAP_W - 1, 1200)
+    tys = rng.integers(1, g.MAP_H - 1, 1200)
+    ok = tile_array(g)[tys, txs] == 0
+    if ok.any():
+        txs, tys = txs[ok], tys[ok]
+        i = int((np.abs(txs - g.spawn_tx) + np.abs(tys - g.spawn_ty)).argmax())
+        g.exit_rect = pygame.Rect(int(txs[i]) * TILE, int(tys[i]) * TILE, TILE * 2, TILE * 2)
+
+def generate_new_floor(g, seed=None, progress=None):
+    # Один генератор на весь этаж: при заданном seed этаж воспроизводим.
+    # g — что угодно с атрибутами этажа (обычно loader.Floor): функция трогает
+    # только данные, поэтому идёт и в фоновом потоке; progress(доля, подпись)
+    if seed is None:
+        seed = random.getrandbits(64)
+    rng = np.random.default_rng(seed)
+    progress = progress or (lambda frac, label: None)
+
     # Генерация тайлов
+    progress(0.0, "Туннели")
     steps = g.MAP_W * g.MAP_H // 2
     rooms = 7
     room_size = 6
-    g.spawn_tx, g.spawn_ty = carve_random_walk(g, steps, rooms, room_size)
+    g.spawn_tx, g.spawn_ty = carve_random_walk(g, steps, rooms, room_size, rng)
 
     # Настройки сложности
     diff = DIFFS[g.settings["difficulty"]]
@@ -145,7 +171,10 @@ def generate_new_floor(g):
     g.TARGET_GOLD = max(200, int(base_target * diff["target_mult"]))
 
     # Сокровища, враги, выход
-    spawn_treasures_by_density(g, g.settings["treasure_density"])
+    progress(0.6, "Сокровища")
+    spawn_treasures_by_density(g, g.settings["treasure_density"], rng)
+    progress(0.75, "Враги")
     base_enemies = max(8, (g.MAP_W * g.MAP_H) // 160)
-    spawn_enemies_scaled(g, base_enemies, diff)
-    spawn_exit_far(g)
+    spawn_enemies_scaled(g, base_enemies, diff, rng)
+    progress(0.9, "Выход")
+    spawn_exit_far(g, rng)
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+import math
+import pygame
+from config import TILE, MINIMAP_SIZES, MINIMAP_ZOOMS, draw_round_rect
+from mapgen import world_to_tile
+
+MM_FLOOR = (90, 95, 110, 200)
+MM_WALL = (50, 55, 70, 220)
+
+class Minimap:
+    # Постоянная карта 1 пиксель на тайл: клетки дорисовываются только
+    # в момент открытия. Вид (масштаб/обрезка) кэшируется до следующего
+    # открытия клеток или смены зума/окна, кадр стоит один-два blit.
+    def __init__(self):
+        self.base = None
+        self.version = 0
+        self.zoom_idx = 0
+        self.size_idx = 0
+        self._view = None
+        self._view_key = None
+        self._frame = None
+        self._frame_key = None
+
+    def reset(self, g):
+        # Пересобрать базу из g.visited (новый этаж или загрузка)
+        self.base = pygame.Surface((g.MAP_W, g.MAP_H), pygame.SRCALPHA)
+        self.base.fill((0, 0, 0, 0))
+        vis = g.visited.view.T != 0
+        if vis.any():
+            floor = g.tiles.view.T == 0
+            rgb = pygame.surfarray.pixels3d(self.base)
+            alpha = pygame.surfarray.pixels_alpha(self.base)
+            for mask, col in ((vis & floor, MM_FLOOR), (vis & ~floor, MM_WALL)):
+                rgb[mask] = col[:3]
+                alpha[mask] = col[3]
+            del rgb, alpha
+        self.version += 1
+
+    def reveal(self, g, cells):
+        if not cells or self.base is None:
+            return
+        base, tiles = self.base, g.tiles
+        for (x, y) in cells:
+            base.set_at((x, y), MM_FLOOR if tiles.get(x, y) == 0 else MM_WALL)
+        self.version += 1
+
+    def zoom(self, delta):
+        self.zoom_idx = max(0, min(len(MINIMAP_ZOOMS) - 1, self.zoom_idx + delta))
+
+    def toggle_size(self):
+        self.size_idx = (self.size_idx + 1) % len(MINIMAP_SIZES)
+
+    def _layout(self, g):
+        max_w, max_h = MINIMAP_SIZES[self.size_idx]
+        scale = min(max_w / g.MAP_W, max_h / g.MAP_H)
+        mm_w, mm_h = int(g.MAP_W * scale), int(g.MAP_H * scale)
+        z = MINIMAP_ZOOMS[self.zoom_idx]
+        cw, ch = min(g.MAP_W, math.ceil(g.MAP_W / z)), min(g.MAP_H, math.ceil(g.MAP_H / z))
+        ptx, pty = world_to_tile(g.player.pos.x, g.player.pos.y)
+        cx = max(0, min(g.MAP_W - cw, ptx - cw // 2))
+        cy = max(0, min(g.MAP_H - ch, pty - ch // 2))
+        return mm_w, mm_h, pygame.Rect(cx, cy, cw, ch)
+
+    def draw(self, g):
+        if self.base is None:
+            return
+        W = g.screen.get_width()
+        mm_w, mm_h, crop = self._layout(g)
+
+        key = (mm_w, mm_h)
+        if self._frame_key != key:
+            self._frame = pygame.Surface((mm_w + 16, mm_h + 16), pygame.SRCALPHA)
+            draw_round_rect(self._frame, self._frame.get_rect(), (0, 0, 0, 160), radius=10, border=2, border_color=(90, 140, 200))
+            self._frame_key = key
+        key = (self.version, mm_w, mm_h, tuple(crop))
+        if self._view_key != key:
+            self._view = pygame.transform.scale(self.base.subsurface(crop), (mm_w, mm_h))
+            self._view_key = key
+
+        ox, oy = W - self._frame.get_width() - 16, 16
+        g.screen.blit(self._frame, (ox, oy))
+        g.screen.blit(self._view, (ox + 8, oy + 8))
+
+        # Маркеры поверх вида
+        sx, sy = mm_w / crop.w, mm_h / crop.h
+        clip = pygame.Rect(ox + 8, oy + 8, mm_w, mm_h)
+        old_clip = g.screen.get_clip()
+        g.screen.set_clip(clip)
+
+        def marker(tx, ty, col, size):
+            r = pygame.Rect(clip.x + int((tx - crop.x) * sx), clip.y + int((ty - crop.y) * sy),
+                            max(size[0], int(size[1] * sx)), max(size[0], int(size[1] * sy)))
+            pygame.draw.rect(g.screen, col, r)
+
+        # Магазин
+        stx, sty = g.shop_rect.x // TILE, g.shop_rect.y // TILE
+        if 0 <= stx < g.MAP_W and 0 <= sty < g.MAP_H and g.visited.get(stx, sty):
+            marker(stx, sty, (120, 180, 255), (0, 2))
+        # Выход
+        if g.exit_rect:
+            etx, ety = g.exit_rect.x // TILE, g.exit_rect.y // TILE
+            if 0 <= etx < g.MAP_W and 0 <= ety < g.MAP_H and g.visited.get(etx, ety):
+                marker(etx, ety, (120, 255, 160) if g.exit_open else (200, 60, 60), (0, 2))
+        # Игрок
+        ptx, pty = world_to_tile(g.player.pos.x, g.player.pos.y)
+        marker(ptx, pty, (255, 255, 255), (2, 1))
+        g.screen.set_clip(old_clip)
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+import math
+import numpy as np
+import pygame
+from config import PARTICLE_CAP
+
+class ParticlePool:
+    # Частицы в преаллоцированных массивах (struct-of-arrays).
+    # Живые лежат в [0, n); мёртвые выжимаются компактизацией за один проход.
+    def __init__(self, capacity=PARTICLE_CAP):
+        self.capacity = capacity
+        self.pos = np.zeros((capacity, 2), np.float32)
+        self.vel = np.zeros((capacity, 2), np.float32)
+        self.life = np.zeros(capacity, np.float32)
+        self.color = np.zeros((capacity, 3), np.uint8)
+        self.size = np.zeros(capacity, np.uint8)
+        self.n = 0
+        self.rng = np.random.default_rng()
+        self._sprites = {}
+
+    def reseed(self, seed):
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return self.n
+
+    def clear(self):
+        self.n = 0
+
+    def emit(self, pos, color, n=10, speed=70):
+        # Лишние частицы при переполнении просто не рождаются
+        n = min(n, self.capacity - self.n)
+        if n <= 0:
+            return
+        s = slice(self.n, self.n + n)
+        ang = self.rng.random(n) * math.tau
+        sp = self.rng.uniform(0.2, 1.0, n) * speed
+        self.pos[s] = (pos[0], pos[1])
+        self.vel[s, 0] = np.cos(ang) * sp
+        self.vel[s, 1] = np.sin(ang) * sp
+        self.life[s] = self.rng.uniform(0.4, 0.9, n)
+        self.color[s] = color[:3]
+        self.size[s] = self.rng.integers(2, 5, n)
+        self.n += n
+
+    def update(self, dt):
+        n = self.n
+        if n == 0:
+            return
+        life = self.life[:n]
+        life -= dt
+        alive = life > 0
+        if not alive.all():
+            n = int(alive.sum())
+            for arr in (self.pos, self.vel, self.life, self.color, self.size):
+                arr[:n] = arr[:self.n][alive]
+            self.n = n
+        self.pos[:n] += self.vel[:n] * dt
+        self.vel[:n] *= 0.92
+
+    def _sprite(self, color, size):
+        key = (color, size)
+        spr = self._sprites.get(key)
+        if spr is None:
+            spr = pygame.Surface((size*2, size*2), pygame.SRCALPHA)
+            pygame.draw.circle(spr, color, (size, size), size)
+            self._sprites[key] = spr
+        return spr
+
+    def draw(self, surf, cam):
+        n = self.n
+        if n == 0:
+            return
+        W, H = surf.get_width(), surf.get_height()
+        xy = (self.pos[:n] - (cam.x, cam.y)).astype(np.int32)
+        size = self.size[:n].astype(np.int32)
+        vis = (xy[:, 0] > -size) & (xy[:, 0] < W + size) & (xy[:, 1] > -size) & (xy[:, 1] < H + size)
+        idx = np.flatnonzero(vis)
+        if idx.size == 0:
+            return
+        xy, size = xy[idx] - size[idx, None], size[idx].tolist()
+        colors = [tuple(c) for c in self.color[idx].tolist()]
+        sprite = self._sprite
+        surf.blits([(sprite(c, s), p) for c, s, p in zip(colors, size, xy.tolist())], False)
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+import csv
+import gc
+import json
+import sys
+import time
+from collections import deque
+import pygame
+from config import draw_round_rect
+
+PROFILE_WINDOW = 600          # кадров в скользящем окне (~10 с при 60 FPS)
+OVERLAY_REFRESH = 30          # пересчёт перцентилей оверлея раз в N кадров
+
+def percentile(sorted_vals, q):
+    if not sorted_vals:
+        return 0.0
+    i = min(len(sorted_vals) - 1, int(round(q / 100 * (len(sorted_vals) - 1))))
+    return sorted_vals[i]
+
+class Profiler:
+    # Покадровые замеры: время каждой системы (мс), число сущностей,
+    # чистый прирост выделенных блоков памяти и число сборок GC.
+    def __init__(self, window=PROFILE_WINDOW):
+        self.frames = deque(maxlen=window)
+        self.order = []           # имена секций в порядке первого появления
+        self.cur = None
+        self.show = False
+        self.frame_no = 0
+        self._overlay = None
+        self._overlay_age = OVERLAY_REFRESH
+
+    def begin_frame(self):
+        self.cur = {"frame": self.frame_no, "times": {}}
+        self._t0 = time.perf_counter()
+        self._blocks0 = sys.getallocatedblocks()
+        self._gc0 = sum(s["collections"] for s in gc.get_stats())
+
+    def run(self, name, fn, *args):
+        # Вызвать систему, записав её время; вне кадра — просто вызов
+        if self.cur is None:
+            return fn(*args)
+        t = time.perf_counter()
+        res = fn(*args)
+        times = self.cur["times"]
+        if name not in times and name not in self.order:
+            self.order.append(name)
+        times[name] = times.get(name, 0.0) + (time.perf_counter() - t) * 1000.0
+        return res
+
+    def end_frame(self, g):
+        cur = self.cur
+        if cur is None:
+            return
+        cur["total"] = (time.perf_counter() - self._t0) * 1000.0
+        cur["alloc_blocks"] = sys.getallocatedblocks() - self._blocks0
+        cur["gc"] = sum(s["collections"] for s in gc.get_stats()) - self._gc0
+        cur["counts"] = {
+            "enemies": len(g.enemies),
+            "projectiles": len(g.projectiles),
+            "particles": len(g.particles),
+            "treasures": len(g.treasures),
+            "float_texts": len(g.float_texts),
+        }
+        self.frames.append(cur)
+        self.cur = None
+        self.frame_no += 1
+        self._overlay_age += 1
+
+    # Статистика
+    def series(self, name):
+        if name == "total":
+            return [f["total"] for f in self.frames]
+        return [f["times"].get(name, 0.0) for f in self.frames]
+
+    def summary(self):
+        out = {}
+        for name in self.order + ["total"]:
+            vals = sorted(self.series(name))
+            out[name] = {
+                "p50": percentile(vals, 50),
+                "p95": percentile(vals, 95),
+                "p99": percentile(vals, 99),
+                "max": vals[-1] if vals else 0.0,
+            }
+        allocs = sorted(f["alloc_blocks"] for f in self.frames)
+        out["alloc_blocks"] = {"p50": percentile(allocs, 50), "p95": percentile(allocs, 95),
+                               "p99": percentile(allocs, 99), "max": allocs[-1] if allocs else 0}
+        out["gc_collections"] = sum(f["gc"] for f in self.frames)
+        return out
+
+    # Выгрузка
+    def dump_csv(self, path):
+        counts = list(self.frames[0]["counts"]) if self.frames else []
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(["frame"] + self.order + ["total", "alloc_blocks", "gc"] + counts)
+            for fr in self.frames:
+                w.writerow([fr["frame"]] + [f"{fr['times'].get(n, 0.0):.4f}" for n in self.order]
+                           + [f"{fr['total']:.4f}", fr["alloc_blocks"], fr["gc"]]
+                           + [fr["counts"][c] for c in counts])
+
+    def dump_json(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"summary": self.summary(), "frames": list(self.frames)}, f, ensure_ascii=False, indent=1)
+
+    # Оверлей
+    def draw(self, g):
+        if not self.show:
+            return
+        if self._overlay is None or self._overlay_age >= OVERLAY_REFRESH:
+            self._overlay = self._build_overlay(g)
+            self._overlay_age = 0
+        g.screen.blit(self._overlay, (16, g.screen.get_height() - self._overlay.get_height() - 16))
+
+    def _build_overlay(self, g):
+        summ = self.summary()
+        last = self.frames[-1] if self.frames else {"counts": {}, "alloc_blocks": 0}
+        lines = [f"{'система':<26}{'p50':>7}{'p95':>7}{'p99':>7}"]
+        for name in self.order + ["total"]:
+            s = summ[name]
+            lines.append(f"{name:<26}{s['p50']:7.2f}{s['p95']:7.2f}{s['p99']:7.2f}")
+        a = summ["alloc_blocks"]
+        lines.append(f"блоки памяти/кадр p50 {a['p50']}  p99 {a['p99']}  GC: {summ['gc_collections']}")
+        lines.append("  ".join(f"{k}={v}" for k, v in last["counts"].items()))
+        imgs = [g.font.render(t, True, (220, 235, 255)) for t in lines]
+        w = max(i.get_width() for i in imgs) + 24
+        h = sum(i.get_height() + 2 for i in imgs) + 20
+        panel = pygame.Surface((w, h), pygame.SRCALPHA)
+        draw_round_rect(panel, panel.get_rect(), (0, 0, 0, 190), radius=10, border=2, border_color=(90, 140, 200))
+        y = 10
+        for img in imgs:
+            panel.blit(img, (12, y))
+            y += img.get_height() + 2
+        return panel
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+# Запись и воспроизведение забегов. Лог — заголовок + zlib-поток записей:
+#   RUN   сид забега и настройки (начало каждого new_run)
+#   TICK  удерживаемые действия (маска controls.HELD), мышь (2×int16),
+#         действия шага (код в controls.PLAY_ACTIONS, смещение в долях шага)
+#   REPEAT  N повторов предыдущего TICK без событий
+#   END   контрольная сумма итогового состояния (для проверки детерминизма)
+# Пишутся действия, а не клавиши: лог не зависит от раскладки.
+# Воспроизведение:  python replay.py run.tdr [--render] [--run N]
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import json
+import struct
+import time
+import zlib
+import pygame
+from config import SIM_DT, STATE_PLAY
+from controls import HELD, PLAY_ACTIONS
+
+MAGIC = b"TDRP"
+VERSION = 3                               # 2: действия вместо клавиш, смещения внутри шага;
+                                          # 3: шаг симуляции — double (float32 сбивал долгие забеги)
+HEADER = struct.Struct("<4sHd")           # magic, версия, шаг симуляции
+
+REC_RUN, REC_TICK, REC_REPEAT, REC_END = 1, 2, 3, 4
+RUN_HEAD = struct.Struct("<BQH")          # тег, сид, длина JSON настроек
+TICK_HEAD = struct.Struct("<BBhhB")       # тег, удержание, mx, my, число действий
+ACTION = struct.Struct("<BB")             # код действия, смещение (доли шага)
+REPEAT = struct.Struct("<BH")
+END = struct.Struct("<BII")               # тег, тиков в забеге, crc32 состояния
+
+ACTION_CODES = {a: i for i, a in enumerate(PLAY_ACTIONS)}
+FLUSH_EVERY = 600                         # тиков между sync-flush (лог переживает падение)
+
+def state_checksum(g, ticks):
+    p = g.player.pos
+    blob = struct.pack("<IiiiiII", ticks, g.gold, g.player.hp,
+                       int(round(p.x * 1000)), int(round(p.y * 1000)),
+                       len(g.enemies), len(g.treasures))
+    return zlib.crc32(blob)
+
+class InputRecorder:
+    # Подключается как g.recorder; update_play отдаёт ему каждый тик
+    def __init__(self, path):
+        self.f = open(path, "wb")
+        self.f.write(HEADER.pack(MAGIC, VERSION, SIM_DT))
+        self.z = zlib.compressobj(9)
+        self.prev = None
+        self.repeat = 0
+        self.ticks = 0
+        self.since_flush = 0
+        self.active = False     # между start_run и end_run; загруженный снимок не пишется
+
+    def _write(self, data):
+        self.f.write(self.z.compress(data))
+
+    def _flush_repeat(self):
+        while self.repeat:
+            n = min(self.repeat, 0xFFFF)
+            self._write(REPEAT.pack(REC_REPEAT, n))
+            self.repeat -= n
+
+    def start_run(self, g):
+        self._flush_repeat()
+        self.prev = None
+        self.ticks = 0
+        self.active = True
+        settings = json.dumps(g.settings, ensure_ascii=False).encode("utf-8")
+        self._write(RUN_HEAD.pack(REC_RUN, g.seed, len(settings)) + settings)
+
+    def tick(self, g, step):
+        # step — controls.StepInput шага
+        if not self.active:
+            return
+        mx, my = step.aim
+        evs = [ACTION.pack(ACTION_CODES[a], sub) for a, sub in step.actions]
+        cur = (step.held, mx, my)
+        if not evs and cur == self.prev and self.repeat < 0xFFFF:
+            self.repeat += 1
+        else:
+            self._flush_repeat()
+            self._write(TICK_HEAD.pack(REC_TICK, step.held, mx, my, len(evs)) + b"".join(evs))
+            self.prev = cur
+        self.ticks += 1
+        self.since_flush += 1
+        if self.since_flush >= FLUSH_EVERY:
+            self._flush_repeat()
+            self.f.write(self.z.flush(zlib.Z_SYNC_FLUSH))
+            self.since_flush = 0
+
+    def end_run(self, g):
+        if not self.active:
+            return
+        self.active = False
+        self._flush_repeat()
+        self._write(END.pack(REC_END, self.ticks, state_checksum(g, self.ticks)))
+        self.f.write(self.z.flush(zlib.Z_SYNC_FLUSH))
+
+    def close(self):
+        self._flush_repeat()
+        self.f.write(self.z.flush())
+        self.f.close()
+
+def read_replay(path):
+    # -> список забегов: {"seed", "settings", "ticks": [(held, mx, my, actions)], "end": (ticks, crc) | None}
+    with open(path, "rb") as f:
+        magic, version, sim_dt = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: не лог забега или неподдерживаемая версия")
+        body = zlib.decompressobj().decompress(f.read())   # обрезанный хвост допустим
+    runs = []
+    run = None
+    i = 0
+    while i < len(body):
+        tag = body[i]
+        if tag == REC_RUN:
+            if i + RUN_HEAD.size > len(body): break
+            _, seed, n = RUN_HEAD.unpack_from(body, i)
+            i += RUN_HEAD.size
+            run = {"seed": seed, "settings": json.loads(body[i:i + n].decode("utf-8")), "ticks": [], "end": None}
+            runs.append(run)
+            i += n
+        elif tag == REC_TICK:
+            if i + TICK_HEAD.size > len(body): break
+            _, bits, mx, my, n = TICK_HEAD.unpack_from(body, i)
+            i += TICK_HEAD.size
+            if i + n * ACTION.size > len(body): break
+            evs = [ACTION.unpack_from(body, i + k * ACTION.size) for k in range(n)]
+            i += n * ACTION.size
+            run["ticks"].append((bits, mx, my, evs))
+        elif tag == REC_REPEAT:
+            if i + REPEAT.size > len(body): break
+            _, n = REPEAT.unpack_from(body, i)
+            i += REPEAT.size
+            prev = run["ticks"][-1]
+            run["ticks"].extend([(prev[0], prev[1], prev[2], [])] * n)
+        elif tag == REC_END:
+            if i + END.size > len(body): break
+            _, ticks, crc = END.unpack_from(body, i)
+            i += END.size
+            run["end"] = (ticks, crc)
+        else:
+            raise ValueError(f"{path}: повреждённая запись (тег {tag})")
+    return sim_dt, runs
+
+class ReplayInput:
+    # Источник ввода из записанных тиков: шаг за шагом подаёт в g.controls
+    # то же удержание, прицел и действия с теми же смещениями
+    def __init__(self, ticks):
+        self.ticks = iter(ticks)
+
+    def poll(self, g):
+        c = g.controls
+        c.held.clear()
+        t = next(self.ticks, None)
+        if t is None:
+            return []
+        held, mx, my, evs = t
+        c.held.update(a for i, a in enumerate(HELD) if held >> i & 1)
+        c.aim = (mx, my)
+        for code, sub in evs:
+            c.push(PLAY_ACTIONS[code], sub)
+        return []
+
+def replay_run(g, run, dt=SIM_DT, render=False):
+    # Пересимулировать забег без ограничения FPS; -> (тиков, crc итога)
+    from systems import update_play
+    from render import draw_world, draw_lighting, draw_ui
+    g.settings.update(run["settings"])
+    g.input = ReplayInput(run["ticks"])
+    g.new_run(run["seed"])
+    ticks = 0
+    while g.state == STATE_PLAY and ticks < len(run["ticks"]):
+        g.controls.dispatch(g.input.poll(g), "play")
+        update_play(g, dt)
+        if render:
+            draw_world(g)
+            draw_lighting(g)
+            draw_ui(g)
+        ticks += 1
+    return ticks, state_checksum(g, ticks)
+
+def main():
+    from headless import make_game
+    ap = argparse.ArgumentParser(description="Воспроизведение записанных забегов")
+    ap.add_argument("path")
+    ap.add_argument("--run", type=int, default=None, help="номер забега (по умолчанию все)")
+    ap.add_argument("--render", action="store_true")
+    args = ap.parse_args()
+
+    sim_dt, runs = read_replay(args.path)
+    g = make_game()
+    ok = True
+    for i, run in enumerate(runs):
+        if args.run is not None and i != args.run:
+            continue
+        t0 = time.perf_counter()
+        ticks, crc = replay_run(g, run, sim_dt, args.render)
+        wall = time.perf_counter() - t0
+        if run["end"] is None:
+            verdict = "без контрольной суммы (лог оборван)"
+        elif run["end"] == (ticks, crc):
+            verdict = "совпало"
+        else:
+            verdict = f"РАСХОЖДЕНИЕ: записано {run['end']}, получено {(ticks, crc)}"
+            ok = False
+        print(f"#{i}: сид={run['seed']} тиков={ticks} {ticks / max(wall, 1e-9):.0f} тик/с — {verdict}")
+    pygame.quit()
+    raise SystemExit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+# Снимок забега: сохранение и загрузка всего состояния Game. Файл —
+# заголовок, таблица секций, данные секций (каждая с границы 8 байт):
+#   META  JSON: настройки, сид, игрок, счётчики, состояния ГСЧ, мир
+#   TILE  VISI  буферы TileMap как есть (с рамкой)
+#   ENMY TRES INVT PROJ PART  сущности — записи фиксированной ширины (dtype ниже)
+#   ARCH  записи спящих чанков бесконечного мира подряд (уже сжаты zlib)
+# Секция лежит как есть или сжатой zlib. Загрузка читает файл через mmap:
+# несжатые секции разбираются прямо из отображения, без чтения в bytes.
+# Производное (поле зрения, поле потока, кэши отрисовки) не сохраняется —
+# оно пересчитывается после загрузки, как после new_run.
+import json
+import mmap
+import os
+import random
+import struct
+import traceback
+import zlib
+import numpy as np
+import pygame
+from tilemap import TileMap
+from entities import EnemyStore, Treasure
+from world import StreamingWorld
+from systems import update_visited_by_player, clamp_camera
+
+MAGIC = b"TDSV"
+VERSION = 1
+HEADER = struct.Struct("<4sHH")           # magic, версия, число секций
+SECTION = struct.Struct("<4sB3xQQQ")      # имя, кодек, смещение, длина в файле, исходная длина
+CODEC_RAW, CODEC_ZLIB = 0, 1
+ALIGN = 8
+
+ENEMY_REC = np.dtype([(name, dtype) for name, dtype in EnemyStore.FIELDS])
+TREASURE_REC = np.dtype([("x", "<f8"), ("y", "<f8"), ("type", "u1")])
+PROJ_REC = np.dtype([("x", "<f8"), ("y", "<f8"), ("vx", "<f8"), ("vy", "<f8"),
+                     ("life", "<f8"), ("dmg", "<i4"), ("from_enemy", "?")])
+PART_REC = np.dtype([("pos", "<f4", 2), ("vel", "<f4", 2), ("life", "<f4"),
+                     ("color", "u1", 3), ("size", "u1")])
+
+def treasure_records(items):
+    rec = np.empty(len(items), TREASURE_REC)
+    rec["x"] = [t.pos.x for t in items]
+    rec["y"] = [t.pos.y for t in items]
+    rec["type"] = [t.type for t in items]
+    return rec
+
+def treasures_from(rec):
+    return [Treasure(pygame.Vector2(x, y), kind)
+            for x, y, kind in zip(rec["x"].tolist(), rec["y"].tolist(), rec["type"].tolist())]
+
+def player_state(p):
+    out = {}
+    for name in type(p).__slots__:
+        v = getattr(p, name)
+        out[name] = [v.x, v.y] if isinstance(v, pygame.Vector2) else v
+    return out
+
+def save_game(g, path, compress=True):
+    # -> размер файла в байтах. compress — zlib (уровень 1) для сеток и сущностей
+    en = g.enemies
+    enemies = np.empty(en.n, ENEMY_REC)
+    for name, _ in EnemyStore.FIELDS:
+        enemies[name] = getattr(en, name)[:en.n]
+
+    projectiles = np.empty(len(g.projectiles), PROJ_REC)
+    for i, p in enumerate(g.projectiles):
+        projectiles[i] = (p.pos.x, p.pos.y, p.vel.x, p.vel.y, p.life, p.dmg, p.from_enemy)
+
+    pp = g.particles
+    particles = np.empty(pp.n, PART_REC)
+    particles["pos"] = pp.pos[:pp.n]
+    particles["vel"] = pp.vel[:pp.n]
+    particles["life"] = pp.life[:pp.n]
+    particles["color"] = pp.color[:pp.n]
+    particles["size"] = pp.size[:pp.n]
+
+    world = None
+    archive = []
+    if g.world is not None:
+        w = g.world
+        archive = list(w.archive.items())
+        world = {"seed": w.seed, "chunk": w.chunk, "window": w.window, "ox": w.ox, "oy": w.oy,
+                 "archive": [[k[0], k[1], len(b)] for k, b in archive]}
+
+    rng = g.rng.getstate()
+    meta = {
+        "settings": g.settings, "seed": g.seed, "state": g.state,
+        "map": [g.MAP_W, g.MAP_H], "spawn": [g.spawn_tx, g.spawn_ty],
+        "shop": list(g.shop_rect), "exit": list(g.exit_rect) if g.exit_rect else None,
+        "exit_open": g.exit_open, "target_gold": g.TARGET_GOLD, "gold": g.gold,
+        "game_over": g.game_over, "win": g.win, "cam": [g.cam.x, g.cam.y],
+        "player": player_state(g.player),
+        "rng": [rng[0], list(rng[1]), rng[2]],
+        "particle_rng": pp.rng.bit_generator.state,
+        "float_texts": [[ft.text, ft.pos.x, ft.pos.y, ft.vy, ft.time, list(ft.color), ft.life]
+                        for ft in g.float_texts],
+        "world": world,
+    }
+
+    sections = [
+        (b"META", json.dumps(meta, ensure_ascii=False).encode("utf-8"), True),
+        (b"TILE", bytes(g.tiles.data), compress),
+        (b"VISI", bytes(g.visited.data), compress),
+        (b"ENMY", enemies.tobytes(), compress),
+        (b"TRES", treasure_records(g.treasures).tobytes(), compress),
+        (b"INVT", treasure_records(g.inventory).tobytes(), compress),
+        (b"PROJ", projectiles.tobytes(), compress),
+        (b"PART", particles.tobytes(), compress),
+        (b"ARCH", b"".join(b for _, b in archive), False),
+    ]
+    table = []
+    body = []
+    off = HEADER.size + SECTION.size * len(sections)
+    for name, raw, packed in sections:
+        data = zlib.compress(raw, 1) if packed else raw
+        pad = -off % ALIGN
+        body.append(b"\0" * pad)
+        off += pad
+        table.append(SECTION.pack(name, CODEC_ZLIB if packed else CODEC_RAW, off, len(data), len(raw)))
+        body.append(data)
+        off += len(data)
+    # Через временный файл: прерванная запись не портит прежнее сохранение
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(sections)))
+        f.write(b"".join(table))
+        f.write(b"".join(body))
+    os.replace(tmp, path)
+    return off
+
+def load_game(g, path):
+    # Заменить текущий забег сохранённым. Битый или обрезанный файл даёт
+    # исключение (ValueError, KeyError, struct.error, zlib.error) до того,
+    # как g хоть в чём-то изменится
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        snap = _decode(mm, path)
+    except BaseException as e:
+        # Кадры _decode в traceback держат виды на mm — без этого close() не пройдёт
+        traceback.clear_frames(e.__traceback__)
+        raise
+    finally:
+        mm.close()
+    _apply(g, snap)
+
+def _decode(mm, path):
+    # Всё содержимое файла -> dict готовых объектов (копии: видов на mm
+    # после выхода не остаётся, иначе mm.close() не пройдёт)
+    magic, version, count = HEADER.unpack_from(mm)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path}: не сохранение или неподдерживаемая версия")
+    table = {}
+    for i in range(count):
+        name, codec, off, n, raw_n = SECTION.unpack_from(mm, HEADER.size + i * SECTION.size)
+        if off + n > len(mm):
+            raise ValueError(f"{path}: секция {name.decode('ascii', 'replace')} обрезана")
+        table[name] = (codec, off, n, raw_n)
+
+    def section(name, dtype=np.uint8):
+        codec, off, n, raw_n = table[name]
+        if codec == CODEC_ZLIB:
+            raw = zlib.decompress(mm[off:off + n])
+            n = len(raw)
+        if n != raw_n:
+            raise ValueError(f"{path}: длина секции {name.decode('ascii', 'replace')} не сходится")
+        if codec == CODEC_ZLIB:
+            return np.frombuffer(raw, dtype)
+        return np.frombuffer(mm, dtype, n // np.dtype(dtype).itemsize, off)
+
+    snap = {}
+    meta = snap["meta"] = json.loads(section(b"META").tobytes().decode("utf-8"))
+    w, h = meta["map"]
+    tiles = snap["tiles"] = TileMap(w, h, fill=1)
+    tiles.grid[:] = section(b"TILE").reshape(tiles.grid.shape)
+    visited = snap["visited"] = TileMap(w, h, fill=0, border=0)
+    visited.grid[:] = section(b"VISI").reshape(visited.grid.shape)
+    snap["archive"] = []
+    if meta["world"] is not None:
+        blobs = section(b"ARCH")
+        pos = 0
+        for cx, cy, n in meta["world"]["archive"]:
+            snap["archive"].append(((cx, cy), blobs[pos:pos + n].tobytes()))
+            pos += n
+        if pos != len(blobs):
+            raise ValueError(f"{path}: архив чанков не сходится с таблицей")
+
+    rec = section(b"ENMY", ENEMY_REC)
+    enemies = snap["enemies"] = EnemyStore(max(256, len(rec)))
+    enemies.put({name: rec[name] for name, _ in EnemyStore.FIELDS})
+    snap["treasures"] = treasures_from(section(b"TRES", TREASURE_REC))
+    snap["inventory"] = treasures_from(section(b"INVT", TREASURE_REC))
+    snap["projectiles"] = section(b"PROJ", PROJ_REC).tolist()
+    snap["particles"] = section(b"PART", PART_REC).copy()
+    prng = snap["particle_rng"] = np.random.Generator(getattr(np.random, meta["particle_rng"]["bit_generator"])())
+    prng.bit_generator.state = meta["particle_rng"]
+    v, state, gauss = meta["rng"]
+    snap["rng"] = (v, tuple(state), gauss)
+    random.Random().setstate(snap["rng"])   # проверка состояния ГСЧ
+    try:
+        snap["spawn"] = tuple(map(int, meta["spawn"]))
+        snap["shop"] = pygame.Rect(meta["shop"])
+        snap["exit"] = pygame.Rect(meta["exit"]) if meta["exit"] else None
+        snap["cam"] = pygame.Vector2(meta["cam"])
+        snap["player"] = {name: pygame.Vector2(v) if isinstance(v, list) else v
+                          for name, v in meta["player"].items()}
+        snap["float_texts"] = [(str(text), float(x), float(y), float(vy), float(t), tuple(color), float(life))
+                               for text, x, y, vy, t, color, life in meta["float_texts"]]
+    except TypeError as e:
+        raise ValueError(f"{path}: повреждённые метаданные ({e})") from None
+    return snap
+
+def _apply(g, snap):
+    meta = snap["meta"]
+
+    # Мир
+    g.settings.update(meta["settings"])
+    g.seed = meta["seed"]
+    g.MAP_W, g.MAP_H = meta["map"]
+    g.tiles = snap["tiles"]
+    g.visited = snap["visited"]
+    g.spawn_tx, g.spawn_ty = snap["spawn"]
+    g.shop_rect = snap["shop"]
+    g.exit_rect = snap["exit"]
+    g.exit_open = meta["exit_open"]
+    g.TARGET_GOLD = meta["target_gold"]
+    if g.world is not None:
+        g.world.close()
+        g.world = None
+    w = meta["world"]
+    if w is not None:
+        g.world = StreamingWorld(w["seed"], w["chunk"], w["window"])
+        g.world.ox, g.world.oy = w["ox"], w["oy"]
+        for key, blob in snap["archive"]:
+            g.world.archive.put(key, blob)
+
+    # Сущности
+    g.enemies = snap["enemies"]
+    g.treasures[:] = snap["treasures"]
+    g.treasure_grid.rebuild(g.treasures)
+    g.inventory[:] = snap["inventory"]
+
+    g.projectiles.clear()
+    for x, y, vx, vy, life, dmg, from_enemy in snap["projectiles"]:
+        p = g.projectiles.spawn()
+        p.pos.update(x, y)
+        p.vel.update(vx, vy)
+        p.life, p.dmg, p.from_enemy = life, dmg, from_enemy
+    g.float_texts.clear()
+    for text, x, y, vy, t, color, life in snap["float_texts"]:
+        ft = g.float_texts.spawn()
+        ft.text = text
+        ft.pos.update(x, y)
+        ft.vy, ft.time, ft.color, ft.life = vy, t, color, life
+    pp = g.particles
+    rec = snap["particles"]
+    pp.n = len(rec)
+    pp.pos[:pp.n] = rec["pos"]
+    pp.vel[:pp.n] = rec["vel"]
+    pp.life[:pp.n] = rec["life"]
+    pp.color[:pp.n] = rec["color"]
+    pp.size[:pp.n] = rec["size"]
+    pp.rng = snap["particle_rng"]
+
+    # Игрок и забег
+    for name, v in snap["player"].items():
+        setattr(g.player, name, v)
+    g.gold = meta["gold"]
+    g.game_over = meta["game_over"]
+    g.win = meta["win"]
+    g.rng.setstate(snap["rng"])
+    g.state = meta["state"]
+
+    # Производное
+    g.cam.update(snap["cam"])
+    g.tile_cache.invalidate()
+    g.minimap.reset(g)
+    g.fov.reset()
+    g.flow.reset()
+    update_visited_by_player(g)
+    clamp_camera(g)
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+from config import TILE
+
+class SpatialHash:
+    # Равномерная сетка с ячейкой TILE: сущность (объект с .pos) лежит
+    # в корзине той ячейки, где её центр.
+    def __init__(self, cell=TILE):
+        self.cell = cell
+        self.cells = {}   # (cx, cy) -> [entity, ...]
+        self.where = {}   # id(entity) -> (cx, cy)
+
+    def _key(self, pos):
+        return (int(pos.x // self.cell), int(pos.y // self.cell))
+
+    def clear(self):
+        self.cells.clear()
+        self.where.clear()
+
+    def rebuild(self, entities):
+        self.clear()
+        for e in entities:
+            self.insert(e)
+
+    def insert(self, e):
+        key = self._key(e.pos)
+        self.cells.setdefault(key, []).append(e)
+        self.where[id(e)] = key
+
+    def remove(self, e):
+        key = self.where.pop(id(e), None)
+        if key is None:
+            return
+        bucket = self.cells[key]
+        bucket.remove(e)
+        if not bucket:
+            del self.cells[key]
+
+    def move(self, e):
+        # Вызывать после смены e.pos; перекладывает только при смене ячейки
+        key = self._key(e.pos)
+        old = self.where.get(id(e))
+        if old == key:
+            return
+        if old is not None:
+            bucket = self.cells[old]
+            bucket.remove(e)
+            if not bucket:
+                del self.cells[old]
+        self.cells.setdefault(key, []).append(e)
+        self.where[id(e)] = key
+
+    def query_radius(self, pos, r):
+        # Все сущности, чей центр строго ближе r к pos
+        c = self.cell
+        x0, x1 = int((pos.x - r) // c), int((pos.x + r) // c)
+        y0, y1 = int((pos.y - r) // c), int((pos.y + r) // c)
+        r2 = r * r
+        out = []
+        cells = self.cells
+        for cy in range(y0, y1 + 1):
+            for cx in range(x0, x1 + 1):
+                bucket = cells.get((cx, cy))
+                if bucket:
+                    for e in bucket:
+                        if (e.pos - pos).length_squared() < r2:
+                            out.append(e)
+        return out
+
+# Ключ ячейки — (строка << ROW_SHIFT) | столбец; BIAS сдвигает ячейки
+# рамки карты (отрицательные) в неотрицательные.
+ROW_SHIFT = 20
+BIAS = 4
+
+class GridIndex:
+    # Статический индекс точек из массивов numpy: перестраивается целиком
+    # одной сортировкой (для сущностей, которые двигаются все и каждый кадр).
+    # Точки одной ячейки — отрезок order[lo:hi], cells: ключ -> (lo, hi).
+    def __init__(self, cell=TILE):
+        self.cell = cell
+        self.cells = {}
+        self.order = []
+        self.xs = []
+        self.ys = []
+
+    def build(self, xs, ys):
+        c = self.cell
+        cx = np.floor_divide(xs, c).astype(np.int64) + BIAS
+        cy = np.floor_divide(ys, c).astype(np.int64) + BIAS
+        keys = (cy << ROW_SHIFT) | cx
+        order = np.argsort(keys, kind="stable")
+        uniq, lo = np.unique(keys[order], return_index=True)
+        hi = np.append(lo[1:], len(order))
+        self.cells = dict(zip(uniq.tolist(), zip(lo.tolist(), hi.tolist())))
+        self.order = order.tolist()
+        self.xs = xs.tolist()
+        self.ys = ys.tolist()
+
+    def query_radius(self, x, y, r):
+        # Индексы точек строго ближе r к (x, y), по возрастанию ячейки
+        c = self.cell
+        x0, x1 = int((x - r) // c) + BIAS, int((x + r) // c) + BIAS
+        y0, y1 = int((y - r) // c) + BIAS, int((y + r) // c) + BIAS
+        r2 = r * r
+        cells, order, xs, ys = self.cells, self.order, self.xs, self.ys
+        out = []
+        for cy in range(y0, y1 + 1):
+            row = cy << ROW_SHIFT
+            for cx in range(x0, x1 + 1):
+                span = cells.get(row | cx)
+                if span is None:
+                    continue
+                for k in range(span[0], span[1]):
+                    i = order[k]
+                    dx, dy = xs[i] - x, ys[i] - y
+                    if dx * dx + dy * dy < r2:
+                        out.append(i)
+        return out
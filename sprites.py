@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import pygame
+from config import TREASURE_TYPES
+
+# Атлас спрайтов сущностей. Каждый вид — тип и размер сокровища, враг по
+# роду и hp, снаряд по стороне — рисуется один раз теми же примитивами,
+# что раньше рисовались каждый кадр, в общую поверхность с colorkey
+# (края у примитивов жёсткие, альфа не нужна). Кадр — один Surface.blits
+# с областями атласа. Якорь спрайта — точка, совпадающая с позицией сущности.
+
+ATLAS_W = 256
+KEY_COLOR = (255, 0, 255)
+TREASURE_SIZES = range(4, 9)    # int(6 + sin(...) * 2)
+ENEMY_HP = (1, 2, 3)
+
+def paint_treasure(surf, x, y, kind, s):
+    pygame.draw.circle(surf, (20,20,20), (x, y+1), s+2)
+    pygame.draw.circle(surf, TREASURE_TYPES[kind]["color"], (x, y), s)
+    pygame.draw.circle(surf, (255,255,255), (x, y - s//2), 2)
+
+def paint_enemy(surf, x, y, spitter, hp):
+    base_col = (200, 130, 80) if spitter else (180, 60, 60)
+    col = base_col if hp >= 2 else (240, 180, 120)
+    pygame.draw.circle(surf, (10,10,10), (x, y+2), 12)
+    pygame.draw.circle(surf, col, (x, y), 12)
+    # HP
+    w = 20
+    pygame.draw.rect(surf, (30,30,30), pygame.Rect(x - w//2, y - 18, w, 4), border_radius=3)
+    pygame.draw.rect(surf, (255,100,100), pygame.Rect(x - w//2, y - 18, int(w * (hp/3)), 4), border_radius=3)
+
+def paint_projectile(surf, x, y, from_enemy):
+    c = (255, 240, 200) if not from_enemy else (255, 150, 150)
+    pygame.draw.circle(surf, c, (x, y), 3)
+
+class SpriteAtlas:
+    def __init__(self):
+        self.surf = None
+        self.sprites = {}   # ключ -> (область в атласе, якорь x, якорь y)
+
+    def specs(self):
+        # (ключ, ширина, высота, якорь x, якорь y, художник, аргументы)
+        out = []
+        for kind in range(len(TREASURE_TYPES)):
+            for s in TREASURE_SIZES:
+                a = s + 3
+                out.append((("treasure", kind, s), 2 * a, 2 * a + 1, a, a, paint_treasure, (kind, s)))
+        for spitter in (False, True):
+            for hp in ENEMY_HP:
+                out.append((("enemy", spitter, hp), 28, 36, 14, 20, paint_enemy, (spitter, hp)))
+        for from_enemy in (False, True):
+            out.append((("proj", from_enemy), 8, 8, 4, 4, paint_projectile, (from_enemy,)))
+        return out
+
+    def build(self):
+        # Полки: спрайты слева направо, новая строка — когда не влезает
+        specs = self.specs()
+        places = []
+        x = y = row_h = 0
+        for spec in specs:
+            w, h = spec[1], spec[2]
+            if x + w > ATLAS_W:
+                x, y, row_h = 0, y + row_h, 0
+            places.append((x, y))
+            x += w
+            row_h = max(row_h, h)
+        surf = pygame.Surface((ATLAS_W, y + row_h))
+        surf.fill(KEY_COLOR)
+        for (key, w, h, ax, ay, paint, args), (x, y) in zip(specs, places):
+            paint(surf, x + ax, y + ay, *args)
+            self.sprites[key] = (pygame.Rect(x, y, w, h), ax, ay)
+        surf.set_colorkey(KEY_COLOR, pygame.RLEACCEL)
+        self.surf = surf
+
+    def batch(self, items, out):
+        # items: (ключ, x, y) на экране -> в out, последовательность для Surface.blits
+        if self.surf is None:
+            self.build()
+        surf, sprites = self.surf, self.sprites
+        for key, x, y in items:
+            area, ax, ay = sprites[key]
+            out.append((surf, (x - ax, y - ay), area))
+        return out
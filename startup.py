@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+import time
+
+# Замеры холодного старта: от запуска до первого кадра меню. main
+# импортирует модуль первым, до pygame, так что в отсчёт входят импорты
+# pygame, numpy и модулей игры.
+T0 = time.perf_counter()
+
+class StartupTimer:
+    def __init__(self, t0=T0):
+        self.t0 = t0
+        self.last = t0
+        self.stages = []        # (этап, мс)
+
+    def mark(self, name):
+        # Закрыть этап: время от предыдущей отметки
+        t = time.perf_counter()
+        self.stages.append((name, (t - self.last) * 1000.0))
+        self.last = t
+
+    def total(self):
+        return (self.last - self.t0) * 1000.0
+
+    def report(self, budget_ms, verbose=False):
+        # Полная таблица — по запросу, строка о превышении бюджета — всегда
+        total = self.total()
+        if verbose:
+            for name, ms in self.stages:
+                print(f"  {name:<16} {ms:7.1f} мс")
+            print(f"  {'итого':<16} {total:7.1f} мс (бюджет {budget_ms} мс)")
+        if total > budget_ms:
+            slow = max(self.stages, key=lambda s: s[1])
+            print(f"Старт {total:.0f} мс — дольше бюджета {budget_ms} мс; дольше всего: {slow[0]} ({slow[1]:.0f} мс)")
+        return total
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+# Прогоны баланса: тысячи headless-забегов с BotInput по сетке параметров
+# сложности на пуле процессов. Точка сетки — набор переопределений полей
+# DIFFS[--difficulty]; в каждой точке --runs забегов с сидами seed, seed+1, ...
+# (сиды во всех точках одни и те же, так что точки сравниваются попарно).
+#   python sweep.py --param enemy_mult=0.8,1.0,1.2 --param sell_mult=1.0,1.25 --runs 200
+# Воркер создаёт Game один раз на процесс и получает забеги пачками по
+# --chunk, обратно уходят только короткие итоги забегов: процессы не делят
+# состояние, а пересылка между ними не зависит от размера карты.
+# Отчёт на точку: доли побед/смертей/недоборов/таймаутов, время до цели по
+# золоту, полученный урон, цена кадра симуляции. --out — то же в JSON.
+# Недобор — собрано всё, а до цели не хватило: это данные баланса. Забеги,
+# где бот перестал продвигаться к цели (BotInput.stalled), — сбой бота:
+# они показаны отдельно и в доли не входят.
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+# SDL иначе перехватывает SIGTERM (превращает в QUIT) и воркер пула не гасится
+os.environ.setdefault("SDL_NO_SIGNAL_HANDLERS", "1")
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import statistics
+import time
+from config import SIM_DT, STATE_PLAY, SIZES, DIFFS
+from headless import make_game, set_size
+from input_source import BotInput
+from systems import update_play
+
+RESULTS = ("win", "dead", "short", "timeout")
+
+_game = None        # Game процесса-воркера
+_base = None        # исходная строка DIFFS его сложности
+
+def init_worker(size, difficulty):
+    global _game, _base
+    _game = make_game({"difficulty": difficulty})
+    set_size(_game, size)
+    _base = dict(DIFFS[difficulty])
+
+def exhausted(g):
+    # Выиграть уже нельзя: нести и подбирать нечего, а враги (с них падает
+    # добыча) кончились. В бесконечном режиме мир подгружается — не тупик
+    return (g.world is None and not g.exit_open and not g.inventory
+            and not g.treasures and len(g.enemies) == 0)
+
+def run_bot(g, seed, max_frames):
+    g.input = BotInput()
+    g.new_run(seed)
+    frames = damage = 0
+    hp = g.player.hp
+    to_target = None
+    t0 = time.perf_counter()
+    while g.state == STATE_PLAY and frames < max_frames:
+        g.controls.dispatch(g.input.poll(g), "play")
+        update_play(g, SIM_DT)
+        frames += 1
+        if g.player.hp < hp:
+            damage += hp - g.player.hp
+        hp = g.player.hp
+        if to_target is None and g.gold >= g.TARGET_GOLD:
+            to_target = frames * SIM_DT
+        if exhausted(g) or g.input.stalled:
+            break
+    wall = time.perf_counter() - t0
+    if g.state == STATE_PLAY:
+        result = "short" if exhausted(g) else "stuck" if g.input.stalled else "timeout"
+    else:
+        result = g.state
+    return {"seed": seed, "result": result, "frames": frames, "to_target": to_target,
+            "damage": damage, "wall": wall}
+
+def run_task(task):
+    # Пачка забегов одной точки сетки -> (номер точки, [итоги])
+    point, overrides, seeds, max_frames = task
+    row = DIFFS[_game.settings["difficulty"]]
+    row.clear()
+    row.update(_base)
+    row.update(overrides)
+    return point, [run_bot(_game, seed, max_frames) for seed in seeds]
+
+def parse_param(text, difficulty):
+    # "имя=v1,v2,..." -> (имя, [значения типа исходного поля])
+    name, _, values = text.partition("=")
+    if name not in DIFFS[difficulty]:
+        raise SystemExit(f"неизвестный параметр сложности: {name} (есть: {', '.join(DIFFS[difficulty])})")
+    kind = type(DIFFS[difficulty][name])
+    return name, [kind(v) for v in values.split(",")]
+
+def summarize(runs):
+    # Доли — по забегам без сбоя бота; цена кадра — по всем
+    frames = sum(r["frames"] for r in runs)
+    wall = sum(r["wall"] for r in runs)
+    out = {"runs": len(runs), "bot_stuck": sum(r["result"] == "stuck" for r in runs) / len(runs)}
+    runs = [r for r in runs if r["result"] != "stuck"]
+    n = max(len(runs), 1)
+    reached = [r["to_target"] for r in runs if r["to_target"] is not None]
+    for res in RESULTS:
+        out[res] = sum(r["result"] == res for r in runs) / n
+    out["reach_target"] = len(reached) / n
+    out["to_target_median_s"] = statistics.median(reached) if reached else None
+    wins = [r["frames"] * SIM_DT for r in runs if r["result"] == "win"]
+    out["win_time_median_s"] = statistics.median(wins) if wins else None
+    out["damage_mean"] = sum(r["damage"] for r in runs) / n
+    out["ms_per_frame"] = wall * 1000 / max(frames, 1)
+    out["frames"] = frames
+    return out
+
+def fmt(v, spec):
+    # Пропуск — прочерк той же ширины, чтобы колонки за ним не съезжали
+    if v is None:
+        return format("—", ">" + spec.partition(".")[0])
+    return format(v, spec)
+
+def main():
+    ap = argparse.ArgumentParser(description="Прогоны баланса Treasure Dungeons")
+    ap.add_argument("--size", default="Средний", choices=[n for n, _, _ in SIZES])
+    ap.add_argument("--difficulty", default="Нормальная", choices=list(DIFFS), help="базовая строка DIFFS")
+    ap.add_argument("--param", action="append", default=[], metavar="ИМЯ=v1,v2",
+                    help="перебираемое поле сложности (можно несколько; сетка — их произведение)")
+    ap.add_argument("--runs", type=int, default=100, help="забегов на точку сетки")
+    ap.add_argument("--seed", type=int, default=1, help="первый сид")
+    ap.add_argument("--frames", type=int, default=60*60*5, help="лимит кадров на забег")
+    ap.add_argument("--jobs", type=int, default=os.cpu_count(), help="процессов (по умолчанию — все ядра)")
+    ap.add_argument("--chunk", type=int, default=5, help="забегов в одной задаче воркера")
+    ap.add_argument("--out", default=None, help="сохранить отчёт в JSON")
+    args = ap.parse_args()
+
+    params = [parse_param(p, args.difficulty) for p in args.param]
+    names = [name for name, _ in params]
+    grid = [dict(zip(names, combo)) for combo in itertools.product(*(vals for _, vals in params))]
+    seeds = list(range(args.seed, args.seed + args.runs))
+    tasks = [(i, point, seeds[k:k + args.chunk], args.frames)
+             for i, point in enumerate(grid) for k in range(0, len(seeds), args.chunk)]
+
+    print(f"{len(grid)} точек × {args.runs} забегов, {args.size}/{args.difficulty}, процессов: {args.jobs}")
+    results = [[] for _ in grid]
+    t0 = time.perf_counter()
+    done = 0
+    with multiprocessing.Pool(args.jobs, initializer=init_worker, initargs=(args.size, args.difficulty)) as pool:
+        for point, runs in pool.imap_unordered(run_task, tasks):
+            results[point].extend(runs)
+            done += len(runs)
+            print(f"\r{done}/{len(grid) * args.runs} забегов, {time.perf_counter() - t0:.0f} с", end="", flush=True)
+        pool.close()
+        pool.join()
+    wall = time.perf_counter() - t0
+    print()
+
+    report = []
+    head = "".join(f"{n:>17}" for n in names)
+    print(f"{head}  побед  смертей  недобор  таймаут  до цели,с  урон  мс/кадр  сбой бота")
+    for point, runs in zip(grid, results):
+        s = summarize(runs)
+        report.append({"params": point, **s})
+        cols = "".join(f"{point[n]:>17}" for n in names)
+        print(f"{cols} {s['win']:6.0%} {s['dead']:8.0%} {s['short']:8.0%} {s['timeout']:8.0%} "
+              f"{fmt(s['to_target_median_s'], '10.1f')} {s['damage_mean']:5.2f} {s['ms_per_frame']:8.3f} "
+              f"{s['bot_stuck']:10.0%}")
+    frames = sum(s["frames"] for s in report)
+    print(f"Итого: {len(grid) * args.runs} забегов, {frames} кадров за {wall:.1f} с "
+          f"({frames / max(wall, 1e-9):.0f} кадр/с на {args.jobs} проц.)")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"size": args.size, "difficulty": args.difficulty, "base": DIFFS[args.difficulty],
+                       "runs": args.runs, "seed": args.seed, "frames": args.frames,
+                       "wall_time": wall, "points": report}, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -1,267 +1,322 @@
 # -*- coding: utf-8 -*-
 import pygame
-import random
 import math
+import numpy as np
 from config import (
-    TILE, COL_GOLD, COL_RED, LIGHT_RADIUS, LIGHT_SOFT, TREASURE_TYPES, DIFFS
+    TILE, COL_GOLD, COL_RED, LIGHT_RADIUS, LIGHT_SOFT, TREASURE_TYPES, DIFFS,
+    STATE_PLAY, STATE_DEAD, STATE_WIN
 )
-from mapgen import world_to_tile, in_bounds, collide_move, is_wall_at_world
+from mapgen import world_to_tile, in_bounds, collide_move, collide_move_many
+from entities import Treasure
+from controls import SUBSTEPS, HOLD_UP, HOLD_LEFT, HOLD_DOWN, HOLD_RIGHT
 
 # Плавающий текст и частицы
 def add_float_text(g, text, pos, color=(230,230,230)):
-    g.float_texts.append({
-        "text": text,
-        "pos": pygame.Vector2(pos),
-        "vy": -22,
-        "time": 0.0,
-        "color": color,
-        "life": 1.2
-    })
+    ft = g.float_texts.spawn()
+    if ft is None:
+        return
+    ft.text = text
+    ft.pos.update(pos)
+    ft.time = 0.0
+    ft.color = color
 
 def update_float_texts(g, dt):
+    pool = g.float_texts
+    items = pool.items
     i = 0
-    while i < len(g.float_texts):
-        ft = g.float_texts[i]
-        ft["time"] += dt
-        ft["pos"].y += ft["vy"] * dt
-        if ft["time"] > ft["life"]:
-            g.float_texts.pop(i); continue
+    while i < pool.n:
+        ft = items[i]
+        ft.time += dt
+        ft.pos.y += ft.vy * dt
+        if ft.time > ft.life:
+            pool.kill(i); continue
         i += 1
 
 def add_particles(g, pos, color, n=10, speed=70):
-    for _ in range(n):
-        ang = random.random() * math.tau
-        v = pygame.Vector2(math.cos(ang), math.sin(ang)) * random.uniform(0.2, 1.0) * speed
-        g.particles.append({
-            "pos": pygame.Vector2(pos),
-            "vel": v,
-            "life": random.uniform(0.4, 0.9),
-            "color": color,
-            "size": random.randint(2, 4)
-        })
+    g.particles.emit(pos, color, n, speed)
 
 def update_particles(g, dt):
-    i = 0
-    while i < len(g.particles):
-        prt = g.particles[i]
-        prt["life"] -= dt
-        if prt["life"] <= 0:
-            g.particles.pop(i); continue
-        prt["pos"] += prt["vel"] * dt
-        prt["vel"] *= 0.92
-        i += 1
+    g.particles.update(dt)
 
 # Камера
 def clamp_camera(g):
-    g.cam.x = max(0, min(g.player["pos"].x - g.screen.get_width()/2, g.MAP_W * TILE - g.screen.get_width()))
-    g.cam.y = max(0, min(g.player["pos"].y - g.screen.get_height()/2, g.MAP_H * TILE - g.screen.get_height()))
+    g.cam.x = max(0, min(g.player.pos.x - g.screen.get_width()/2, g.MAP_W * TILE - g.screen.get_width()))
+    g.cam.y = max(0, min(g.player.pos.y - g.screen.get_height()/2, g.MAP_H * TILE - g.screen.get_height()))
 
 # Туман войны
-def mark_visited_radius(g, tx, ty, r=1):
-    for dy in range(-r, r+1):
-        for dx in range(-r, r+1):
-            x = tx + dx
-            y = ty + dy
-            if in_bounds(g, x, y):
-                g.visited[y][x] = True
-
 def update_visited_by_player(g):
-    tx, ty = world_to_tile(g.player["pos"].x, g.player["pos"].y)
+    # Поле зрения пересчитывается только при смене тайла игрока
+    tx, ty = world_to_tile(g.player.pos.x, g.player.pos.y)
     if in_bounds(g, tx, ty):
-        mark_visited_radius(g, tx, ty, r=2)
+        g.minimap.reveal(g, g.fov.update(g))
 
 # Игровые системы
+def remove_treasure(g, it):
+    # Удаление за O(1): на место подобранного встаёт последний. Список
+    # пересобирают целиком (генерация, чанки мира, загрузка) — тогда
+    # сохранённый индекс устарел, и список один раз переиндексируется
+    items = g.treasures
+    i = it.idx
+    if not (0 <= i < len(items) and items[i] is it):
+        for n, t in enumerate(items):
+            t.idx = n
+        i = it.idx
+    last = items.pop()
+    if last is not it:
+        items[i] = last
+        last.idx = i
+
 def pick_up_items(g):
-    i = 0
-    while i < len(g.treasures):
-        it = g.treasures[i]
-        if (it["pos"] - g.player["pos"]).length_squared() < (12+10)**2:
-            g.inventory.append({"type": it["type"]})
-            t = TREASURE_TYPES[it["type"]]
-            add_particles(g, it["pos"], t["color"], n=12, speed=110)
-            add_float_text(g, f"+{t['value']}", it["pos"], t["color"])
-            g.treasures.pop(i)
-        else:
-            i += 1
+    for it in g.treasure_grid.query_radius(g.player.pos, 12+10):
+        g.inventory.append(it)
+        t = TREASURE_TYPES[it.type]
+        add_particles(g, it.pos, t["color"], n=12, speed=110)
+        add_float_text(g, f"+{t['value']}", it.pos, t["color"])
+        g.treasure_grid.remove(it)
+        remove_treasure(g, it)
 
 def sell_all(g):
     diff = DIFFS[g.settings["difficulty"]]
     if not g.inventory:
         return
-    value = sum(TREASURE_TYPES[it["type"]]["value"] for it in g.inventory)
+    value = sum(TREASURE_TYPES[it.type]["value"] for it in g.inventory)
     value = int(value * diff["sell_mult"])
     if value > 0:
         g.gold += value
-        add_particles(g, g.player["pos"], COL_GOLD, n=24, speed=150)
-        add_float_text(g, f"+{value} золота", g.player["pos"], COL_GOLD)
+        add_particles(g, g.player.pos, COL_GOLD, n=24, speed=150)
+        add_float_text(g, f"+{value} золота", g.player.pos, COL_GOLD)
         g.inventory.clear()
         g.open_exit_if_ready()
 
-def fire_projectile(g, target_pos):
-    if g.player["shoot_cd"] > 0:
+def spawn_projectile(g, x, y, vx, vy, life, from_enemy=False):
+    # Снаряд из пула; при переполнении выстрел пропадает
+    p = g.projectiles.spawn()
+    if p is None:
+        return
+    p.pos.update(x, y)
+    p.vel.update(vx, vy)
+    p.life = life
+    p.dmg = 1
+    p.from_enemy = from_enemy
+
+def fire_projectile(g, target_pos, at=0.0):
+    # at — момент выстрела от начала шага: update_projectiles сдвинет снаряд
+    # на весь шаг, поэтому он рождается на at «раньше» и живёт на at дольше
+    if g.player.shoot_cd > 0:
         return
-    src = pygame.Vector2(g.player["pos"])
+    src = pygame.Vector2(g.player.pos)
     dir = (target_pos - src)
     if dir.length() == 0:
         return
     dir = dir.normalize()
-    vel = dir * g.player["proj_speed"]
-    g.projectiles.append({
-        "pos": pygame.Vector2(src + dir * 14),
-        "vel": vel,
-        "life": 1.2,
-        "dmg": 1,
-        "from_enemy": False
-    })
+    speed = g.player.proj_speed
+    vx, vy = dir.x * speed, dir.y * speed
+    spawn_projectile(g, src.x + dir.x * 14 - vx * at, src.y + dir.y * 14 - vy * at, vx, vy, 1.2 + at)
     # отдача
-    g.player["pos"] = collide_move(g, g.player["pos"], -dir * g.player["recoil"], radius=10)
+    g.player.pos = collide_move(g, g.player.pos, -dir * g.player.recoil, radius=10)
     add_particles(g, src + dir * 10, (220, 240, 255), n=6, speed=90)
-    g.player["shoot_cd"] = g.player["fire_rate"]
+    g.player.shoot_cd = g.player.fire_rate
 
 def update_projectiles(g, dt):
+    # Удаление обменом с последним: после kill(i) на месте i уже другой снаряд
+    pool = g.projectiles
+    items = pool.items
+    wall_at = g.tiles.wall_at
+    en = g.enemies
+    query = en.query_radius
+    killed = False
     i = 0
-    while i < len(g.projectiles):
-        p = g.projectiles[i]
-        p["life"] -= dt
-        if p["life"] <= 0:
-            g.projectiles.pop(i); continue
-        new_pos = p["pos"] + p["vel"] * dt
-        if is_wall_at_world(g, new_pos.x, new_pos.y):
-            add_particles(g, p["pos"], (255, 230, 160) if not p["from_enemy"] else (255, 120, 120), n=8, speed=120)
-            g.projectiles.pop(i); continue
-        p["pos"] = new_pos
+    while i < pool.n:
+        p = items[i]
+        p.life -= dt
+        if p.life <= 0:
+            pool.kill(i); continue
+        pos, vel = p.pos, p.vel
+        nx, ny = pos.x + vel.x * dt, pos.y + vel.y * dt
+        if wall_at(nx, ny):
+            add_particles(g, pos, (255, 230, 160) if not p.from_enemy else (255, 120, 120), n=8, speed=120)
+            pool.kill(i); continue
+        pos.update(nx, ny)
 
-        if p["from_enemy"]:
-            if (p["pos"] - g.player["pos"]).length_squared() < (10+4)**2:
-                if g.player["hurt_cd"] <= 0:
-                    g.player["hp"] -= p["dmg"]
-                    g.player["hurt_cd"] = 0.9
-                    add_float_text(g, f"-{p['dmg']} HP", g.player["pos"], COL_RED)
-                    if g.player["hp"] <= 0:
+        if p.from_enemy:
+            if pos.distance_squared_to(g.player.pos) < (10+4)**2:
+                if g.player.hurt_cd <= 0:
+                    g.player.hp -= p.dmg
+                    g.player.hurt_cd = 0.9
+                    add_float_text(g, f"-{p.dmg} HP", g.player.pos, COL_RED)
+                    if g.player.hp <= 0:
                         g.game_over = True
-                g.projectiles.pop(i); continue
+                pool.kill(i); continue
         else:
-            hit = False
-            for e in g.enemies[:]:
-                if (p["pos"] - e["pos"]).length_squared() < (12+4)**2:
-                    e["hp"] -= p["dmg"]
-                    add_particles(g, e["pos"], (255, 200, 160), n=10, speed=120)
-                    add_float_text(g, f"-{p['dmg']}", e["pos"], (255, 150, 150))
-                    if e["hp"] <= 0:
-                        if random.random() < 0.33:
-                            weights = [t["weight"] for t in TREASURE_TYPES]
-                            g.treasures.append({
-                                "pos": pygame.Vector2(e["pos"]),
-                                "type": random.choices(range(len(TREASURE_TYPES)), weights=weights)[0]
-                            })
-                        g.enemies.remove(e)
-                    hit = True
-                    break
-            if hit:
-                g.projectiles.pop(i); continue
+            hits = query(pos.x, pos.y, 12+4)
+            if hits:
+                e = hits[0]
+                epos = (float(en.x[e]), float(en.y[e]))
+                en.hp[e] -= p.dmg
+                add_particles(g, epos, (255, 200, 160), n=10, speed=120)
+                add_float_text(g, f"-{p.dmg}", epos, (255, 150, 150))
+                if en.hp[e] <= 0:
+                    # Убитый остаётся в массивах до compact() в конце прохода
+                    killed = True
+                    if g.rng.random() < 0.33:
+                        weights = [t["weight"] for t in TREASURE_TYPES]
+                        drop = Treasure(pygame.Vector2(epos),
+                                        g.rng.choices(range(len(TREASURE_TYPES)), weights=weights)[0])
+                        drop.idx = len(g.treasures)
+                        g.treasures.append(drop)
+                        g.treasure_grid.insert(drop)
+                pool.kill(i); continue
         i += 1
+    if killed:
+        en.compact()
 
 def enemy_ai_and_collisions(g, dt):
-    ppos = pygame.Vector2(g.player["pos"])
+    # Один пакетный шаг для всех врагов сразу: массивы EnemyStore
+    # обновляются на месте, в Python остаются только редкие события
+    # (выстрелы плевунов и контакт с игроком)
+    g.flow.update(g)
+    en = g.enemies
+    n = en.n
+    if n == 0:
+        return
     diff = DIFFS[g.settings["difficulty"]]
-    for e in g.enemies[:]:
-        e["t"] += dt
-        to_p = ppos - e["pos"]
-        dist = to_p.length()
-        if dist < 240:
-            e["state"] = "chase"
-        elif dist > 300:
-            e["state"] = "wander"
+    px, py = g.player.pos.x, g.player.pos.y
+    x, y, t = en.x[:n], en.y[:n], en.t[:n]
+    t += dt
+    dx, dy = px - x, py - y
+    dist = np.hypot(dx, dy)
+    chase = en.chase[:n]
+    chase |= dist < 240
+    chase &= dist <= 300
 
-        if e["state"] == "chase":
-            if dist > 1:
-                to_p.scale_to_length(65 * diff["enemy_speed"])
-                desired = to_p
-            else:
-                desired = pygame.Vector2()
-        else:
-            desired = pygame.Vector2(math.cos(e["t"]*0.8), math.sin(e["t"]*0.7)) * (40 * diff["enemy_speed"])
+    # Преследование: шаг по полю потока; вне поля и на тайле игрока — напрямую
+    sx, sy, ok = g.flow.next_points(x, y)
+    sx -= x
+    sy -= y
+    ok &= sx * sx + sy * sy > 1
+    dx = np.where(ok, sx, dx)
+    dy = np.where(ok, sy, dy)
+    k = np.where(chase & (dist > 1), 65 * diff["enemy_speed"] / np.maximum(np.hypot(dx, dy), 1e-9), 0.0)
+    vx, vy = dx * k, dy * k
+    # Блуждание
+    wander = ~chase
+    if wander.any():
+        w = 40 * diff["enemy_speed"]
+        vx = np.where(wander, np.cos(t * 0.8) * w, vx)
+        vy = np.where(wander, np.sin(t * 0.7) * w, vy)
 
-        e["pos"] = collide_move(g, e["pos"], desired * dt, radius=10)
+    x[:], y[:] = collide_move_many(g.tiles, x, y, vx * dt, vy * dt, 10)
+    en.index_dirty = True
 
-        # Плевок
-        if e["kind"] == "spitter":
-            e["atk_cd"] -= dt
-            if e["atk_cd"] <= 0 and dist < 320:
-                dir = (ppos - e["pos"])
-                if dir.length() > 0:
-                    dir = dir.normalize()
-                    vel = dir * 260.0
-                    g.projectiles.append({
-                        "pos": pygame.Vector2(e["pos"]),
-                        "vel": vel,
-                        "life": 2.0,
-                        "dmg": 1,
-                        "from_enemy": True
-                    })
-                    e["atk_cd"] = random.uniform(0.9, 1.4)
+    # Плевок
+    cd = en.atk_cd[:n]
+    spit = en.spitter[:n]
+    cd[spit] -= dt
+    for i in np.flatnonzero(spit & (cd <= 0) & (dist < 320)).tolist():
+        ddx, ddy = px - x[i], py - y[i]
+        d = math.hypot(ddx, ddy)
+        if d > 0:
+            spawn_projectile(g, x[i], y[i], ddx / d * 260.0, ddy / d * 260.0, 2.0, from_enemy=True)
+            cd[i] = g.rng.uniform(0.9, 1.4)
 
-        # Контактный урон
-        if (e["pos"] - ppos).length_squared() < (10+12)**2:
-            if g.player["hurt_cd"] <= 0:
-                g.player["hp"] -= 1
-                g.player["hurt_cd"] = 0.9
-                add_float_text(g, "-1 HP", g.player["pos"], COL_RED)
-                push = (ppos - e["pos"])
-                if push.length() > 0:
-                    push.scale_to_length(120)
-                    g.player["pos"] = collide_move(g, g.player["pos"], push * dt, radius=10)
-                if g.player["hp"] <= 0:
-                    g.game_over = True
+    # Контактный урон: после попадания игрок неуязвим hurt_cd, так что
+    # достаточно первого касающегося врага
+    if g.player.hurt_cd <= 0:
+        touch = np.flatnonzero((x - px) ** 2 + (y - py) ** 2 < (10+12)**2)
+        if touch.size:
+            i = int(touch[0])
+            g.player.hp -= 1
+            g.player.hurt_cd = 0.9
+            add_float_text(g, "-1 HP", g.player.pos, COL_RED)
+            push = pygame.Vector2(px - x[i], py - y[i])
+            if push.length() > 0:
+                push.scale_to_length(120)
+                g.player.pos = collide_move(g, g.player.pos, push * dt, radius=10)
+            if g.player.hp <= 0:
+                g.game_over = True
 
-def handle_input(g, dt, events):
-    keys = pygame.key.get_pressed()
+def advance_player(g, move, dt):
+    # Движение и кулдауны игрока на отрезок dt внутри шага; рывок длится
+    # ровно dash_time, даже если кончается посреди отрезка
+    p = g.player
+    boost = min(p.dash_time, dt)
+    p.pos = collide_move(g, p.pos, move * (p.speed * (dt + boost * (p.dash_mult - 1))), radius=10)
+    p.dash_time -= boost
+    p.dash_cd = max(0.0, p.dash_cd - dt)
+    p.hurt_cd = max(0.0, p.hurt_cd - dt)
+    p.sell_cd = max(0.0, p.sell_cd - dt)
+    p.shoot_cd = max(0.0, p.shoot_cd - dt)
+
+def handle_input(g, dt, step):
+    # step — controls.StepInput; действия применяются в свой момент шага:
+    # до него игрок идёт и кулдауны тикают, рывок и выстрел — с этой точки
+    held = step.held
     move = pygame.Vector2(0, 0)
-    if keys[pygame.K_w]: move.y -= 1
-    if keys[pygame.K_s]: move.y += 1
-    if keys[pygame.K_a]: move.x -= 1
-    if keys[pygame.K_d]: move.x += 1
+    if held & HOLD_UP: move.y -= 1
+    if held & HOLD_DOWN: move.y += 1
+    if held & HOLD_LEFT: move.x -= 1
+    if held & HOLD_RIGHT: move.x += 1
     if move.length_squared() > 0:
         move = move.normalize()
-        g.player["dir"] = move
-
-    speed = g.player["speed"]
-    if g.player["dash_time"] > 0:
-        speed *= g.player["dash_mult"]
-    g.player["pos"] = collide_move(g, g.player["pos"], move * speed * dt, radius=10)
+        g.player.dir = move
 
-    for e in events:
-        if e.type == pygame.MOUSEBUTTONDOWN and e.button == 1:
-            mx, my = pygame.mouse.get_pos()
-            world_target = pygame.Vector2(mx + g.cam.x, my + g.cam.y)
-            fire_projectile(g, world_target)
-        if e.type == pygame.KEYDOWN:
-            if e.key == pygame.K_SPACE:
-                mx, my = pygame.mouse.get_pos()
-                world_target = pygame.Vector2(mx + g.cam.x, my + g.cam.y)
-                fire_projectile(g, world_target)
-            if e.key in (pygame.K_LSHIFT, pygame.K_RSHIFT):
-                moving = keys[pygame.K_w] or keys[pygame.K_a] or keys[pygame.K_s] or keys[pygame.K_d]
-                if g.player["dash_cd"] <= 0 and g.player["dash_time"] <= 0 and moving:
-                    g.player["dash_time"] = 0.18
-                    g.player["dash_cd"] = 0.9
-            if e.key == pygame.K_e and g.player["sell_cd"] <= 0:
-                if g.shop_rect.collidepoint(g.player["pos"].x, g.player["pos"].y) and len(g.inventory) > 0:
-                    sell_all(g)
-                    g.player["sell_cd"] = 0.3
-            if e.key == pygame.K_F1:
-                g.show_controls = not g.show_controls
-            if e.key == pygame.K_TAB:
-                g.show_minimap = not g.show_minimap
-
-    # Тики кулдаунов
-    g.player["dash_cd"] = max(0.0, g.player["dash_cd"] - dt)
-    g.player["dash_time"] = max(0.0, g.player["dash_time"] - dt)
-    g.player["hurt_cd"] = max(0.0, g.player["hurt_cd"] - dt)
-    g.player["sell_cd"] = max(0.0, g.player["sell_cd"] - dt)
-    g.player["shoot_cd"] = max(0.0, g.player["shoot_cd"] - dt)
+    t = 0.0
+    for action, sub in step.actions:
+        at = sub * dt / SUBSTEPS
+        if at > t:
+            advance_player(g, move, at - t)
+            t = at
+        if action == "fire":
+            mx, my = step.aim
+            fire_projectile(g, pygame.Vector2(mx + g.cam.x, my + g.cam.y), at)
+        elif action == "dash":
+            if g.player.dash_cd <= 0 and g.player.dash_time <= 0 and held:
+                g.player.dash_time = 0.18
+                g.player.dash_cd = 0.9
+        elif action == "sell" and g.player.sell_cd <= 0:
+            if g.shop_rect.collidepoint(g.player.pos.x, g.player.pos.y) and len(g.inventory) > 0:
+                sell_all(g)
+                g.player.sell_cd = 0.3
+        elif action == "help":
+            g.show_controls = not g.show_controls
+        elif action == "minimap":
+            g.show_minimap = not g.show_minimap
+        elif action == "zoom_in":
+            g.minimap.zoom(+1)
+        elif action == "zoom_out":
+            g.minimap.zoom(-1)
+        elif action == "minimap_size":
+            g.minimap.toggle_size()
+    advance_player(g, move, dt - t)
 
 def check_exit(g):
     if not g.exit_rect or not g.exit_open: return
-    if g.exit_rect.collidepoint(g.player["pos"].x, g.player["pos"].y):
+    if g.exit_rect.collidepoint(g.player.pos.x, g.player.pos.y):
         g.win = True
+
+# Один шаг симуляции в состоянии игры
+def update_play(g, dt):
+    # Ввод шага — из очереди g.controls (туда его кладут dispatch и скриптовые источники)
+    step = g.controls.take()
+    if g.recorder is not None:
+        g.recorder.tick(g, step)
+    prof = g.profiler
+    prof.run("handle_input", handle_input, g, dt, step)
+    if g.world is not None:
+        prof.run("stream_world", g.world.update, g)
+    prof.run("update_visited_by_player", update_visited_by_player, g)
+
+    clamp_camera(g)
+    prof.run("pick_up_items", pick_up_items, g)
+    prof.run("enemy_ai_and_collisions", enemy_ai_and_collisions, g, dt)
+    prof.run("update_projectiles", update_projectiles, g, dt)
+    prof.run("update_particles", update_particles, g, dt)
+    prof.run("update_float_texts", update_float_texts, g, dt)
+    check_exit(g)
+
+    if g.game_over:
+        g.state = STATE_DEAD
+    elif g.win:
+        g.state = STATE_WIN
+    if g.recorder is not None and g.state != STATE_PLAY:
+        g.recorder.end_run(g)
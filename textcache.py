@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from collections import OrderedDict
+from config import TEXT_CACHE_SIZE
+
+class TextCache:
+    # Отрисованные строки по ключу (шрифт, текст, цвет) с вытеснением LRU
+    def __init__(self, capacity=TEXT_CACHE_SIZE):
+        self.capacity = capacity
+        self.items = OrderedDict()
+
+    def render(self, font, text, color):
+        key = (font, text, color)
+        img = self.items.get(key)
+        if img is not None:
+            self.items.move_to_end(key)
+            return img
+        img = font.render(text, True, color)
+        self.items[key] = img
+        if len(self.items) > self.capacity:
+            self.items.popitem(last=False)
+        return img
+
+    def clear(self):
+        self.items.clear()
+
+class CachedLayer:
+    # Поверхность, которая перестраивается только при смене ключа
+    def __init__(self):
+        self.key = None
+        self.surf = None
+
+    def get(self, key, build):
+        if self.surf is None or key != self.key:
+            self.surf = build()
+            self.key = key
+        return self.surf
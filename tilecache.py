@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+import pygame
+import math
+from config import TILE, COL_BG, COL_FLOOR, COL_WALL
+
+# Размер чанка в тайлах
+CHUNK = 16
+CHUNK_PX = CHUNK * TILE
+
+COL_WALL_EDGE = (COL_WALL[0]+10, COL_WALL[1]+10, COL_WALL[2]+10)
+
+def draw_tile(surf, tile, tx, ty, x, y):
+    r = pygame.Rect(x, y, TILE, TILE)
+    if tile == 0:
+        shade = (tx + ty) % 2
+        col = (COL_FLOOR[0] + shade*3, COL_FLOOR[1] + shade*3, COL_FLOOR[2] + shade*3)
+        pygame.draw.rect(surf, col, r)
+    else:
+        pygame.draw.rect(surf, COL_WALL, r)
+        pygame.draw.line(surf, COL_WALL_EDGE, (r.left, r.top), (r.right, r.top), 2)
+
+class TileCache:
+    # Слой пола/стен, пререндеренный в чанки. Чанк рисуется один раз за этаж
+    # (лениво, при первом попадании в кадр), дальше — только blit.
+    def __init__(self):
+        self.chunks = {}      # (cx, cy) -> Surface
+        self.dirty = {}       # (cx, cy) -> {(tx, ty)} — точечные правки
+        self.spare = []       # поверхности прошлого этажа для повторного использования
+
+    def invalidate(self):
+        # Новый этаж: все чанки устарели, поверхности уходят в запас
+        self.spare.extend(self.chunks.values())
+        self.chunks.clear()
+        self.dirty.clear()
+
+    def shift(self, g, dtx, dty):
+        # Карта сдвинулась на (dtx, dty) тайлов, кратно CHUNK (бесконечный мир):
+        # отрисованные чанки переезжают на новые ключи, ушедшие за карту — в запас
+        dcx, dcy = dtx // CHUNK, dty // CHUNK
+        max_cx, max_cy = (g.MAP_W - 1) // CHUNK, (g.MAP_H - 1) // CHUNK
+        chunks = {}
+        for (cx, cy), surf in self.chunks.items():
+            key = (cx - dcx, cy - dcy)
+            if 0 <= key[0] <= max_cx and 0 <= key[1] <= max_cy:
+                chunks[key] = surf
+            else:
+                self.spare.append(surf)
+        self.chunks = chunks
+        self.dirty = {(cx - dcx, cy - dcy): {(x - dtx, y - dty) for (x, y) in cells}
+                      for (cx, cy), cells in self.dirty.items() if (cx - dcx, cy - dcy) in chunks}
+
+    def mark_dirty(self, tx, ty, w=1, h=1):
+        for y in range(ty, ty + h):
+            for x in range(tx, tx + w):
+                key = (x // CHUNK, y // CHUNK)
+                if key in self.chunks:
+                    self.dirty.setdefault(key, set()).add((x, y))
+
+    def _render_chunk(self, g, key, surf):
+        cx, cy = key
+        surf.fill(COL_BG)
+        x0, y0 = cx * CHUNK, cy * CHUNK
+        tiles = g.tiles
+        for ty in range(y0, min(g.MAP_H, y0 + CHUNK)):
+            for tx in range(x0, min(g.MAP_W, x0 + CHUNK)):
+                draw_tile(surf, tiles.get(tx, ty), tx, ty, (tx - x0) * TILE, (ty - y0) * TILE)
+
+    def _patch_chunk(self, g, key, surf, cells):
+        cx, cy = key
+        for (tx, ty) in cells:
+            x, y = (tx - cx * CHUNK) * TILE, (ty - cy * CHUNK) * TILE
+            surf.set_clip(pygame.Rect(x, y, TILE, TILE))
+            if 0 <= tx < g.MAP_W and 0 <= ty < g.MAP_H:
+                draw_tile(surf, g.tiles.get(tx, ty), tx, ty, x, y)
+            else:
+                surf.fill(COL_BG)
+        surf.set_clip(None)
+
+    def get_chunk(self, g, key):
+        surf = self.chunks.get(key)
+        if surf is None:
+            surf = self.spare.pop() if self.spare else pygame.Surface((CHUNK_PX, CHUNK_PX))
+            self.chunks[key] = surf
+            self._render_chunk(g, key, surf)
+        elif key in self.dirty:
+            self._patch_chunk(g, key, surf, self.dirty.pop(key))
+        return surf
+
+    def draw(self, g, surf):
+        W, H = surf.get_width(), surf.get_height()
+        # ceil: тайлы встают на те же пиксели, что и при усечении Rect(tx*TILE - cam)
+        ox, oy = math.ceil(g.cam.x), math.ceil(g.cam.y)
+        start_cx = max(0, int(g.cam.x // CHUNK_PX))
+        end_cx = min((g.MAP_W - 1) // CHUNK, int((g.cam.x + W) // CHUNK_PX))
+        start_cy = max(0, int(g.cam.y // CHUNK_PX))
+        end_cy = min((g.MAP_H - 1) // CHUNK, int((g.cam.y + H) // CHUNK_PX))
+        for cy in range(start_cy, end_cy + 1):
+            for cx in range(start_cx, end_cx + 1):
+                chunk = self.get_chunk(g, (cx, cy))
+                surf.blit(chunk, (cx * CHUNK_PX - ox, cy * CHUNK_PX - oy))
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+from config import TILE
+
+# Ширина рамки вокруг карты. Сущности не покидают пол дальше чем на
+# радиус коллизии (< TILE), поэтому запросы по мировым координатам
+# всегда попадают в рамку и проверки границ не нужны.
+PAD = 2
+
+class TileMap:
+    # Сетка 1 байт на клетку: bytearray построчно (row-major) с рамкой PAD
+    # клеток значения border. Поверх того же буфера — numpy-вид для пакетных операций.
+    def __init__(self, w, h, fill=1, border=1):
+        self.w, self.h = w, h
+        self.stride = w + 2 * PAD
+        self.offset = PAD * self.stride + PAD     # индекс клетки (0, 0)
+        self.data = bytearray([border]) * (self.stride * (h + 2 * PAD))
+        self.grid = np.frombuffer(self.data, dtype=np.uint8).reshape(h + 2 * PAD, self.stride)
+        self.view = self.grid[PAD:PAD + h, PAD:PAD + w]
+        self.view[:] = fill
+
+    def index(self, tx, ty):
+        return self.offset + ty * self.stride + tx
+
+    def get(self, tx, ty):
+        # Допустимо для -PAD <= tx < w + PAD (и так же по y)
+        return self.data[self.offset + ty * self.stride + tx]
+
+    def set(self, tx, ty, v):
+        self.data[self.offset + ty * self.stride + tx] = v
+
+    def wall_at(self, x, y):
+        # Стена под мировой точкой; точка должна лежать в пределах рамки
+        return self.data[self.offset + int(y // TILE) * self.stride + int(x // TILE)] != 0
+
+    def walls_at(self, xs, ys):
+        # Пакетный запрос: какие из N мировых точек в стенах (точки вне рамки — стены)
+        tx = np.floor_divide(xs, TILE).astype(np.intp) + PAD
+        ty = np.floor_divide(ys, TILE).astype(np.intp) + PAD
+        inside = (tx >= 0) & (tx < self.stride) & (ty >= 0) & (ty < self.h + 2 * PAD)
+        out = np.ones(tx.shape, bool)
+        out[inside] = self.grid[ty[inside], tx[inside]] != 0
+        return out
@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+# Бесконечный мир. Подземелье — сетка чанков WORLD_CHUNK×WORLD_CHUNK тайлов,
+# каждый строится по (сид, координаты чанка) независимо от соседей; проходы
+# через общие грани тоже задаются сидом грани, так что чанки стыкуются.
+# В g.tiles лежит только окно WORLD_WINDOW×WORLD_WINDOW чанков с игроком
+# в центральном. Когда игрок переходит в соседний чанк, окно сдвигается:
+# уходящие чанки засыпают (враги, сокровища и туман сжимаются в запись
+# архива), входящие генерируются заново или просыпаются из архива, а
+# координаты всего живого сдвигаются на размер чанка — остальные системы
+# видят обычную карту MAP_W×MAP_H.
+import struct
+import tempfile
+import zlib
+from collections import OrderedDict
+import numpy as np
+import pygame
+from config import TILE, TREASURE_TYPES, DIFFS, WORLD_CHUNK, WORLD_WINDOW, WORLD_ARCHIVE_MEM
+from tilemap import TileMap
+from entities import Treasure, EnemyStore
+from mapgen import random_walk, smooth_walls
+from systems import update_visited_by_player
+
+SEED_BIAS = 1 << 31     # SeedSequence принимает только неотрицательные числа
+ARCHIVE_COMPACT_MIN = 1 << 20   # мёртвых байт в файле архива, после которых он может сжиматься
+STREAM_TILES, STREAM_SPAWN, STREAM_DOOR_X, STREAM_DOOR_Y = 0, 1, 2, 3
+
+def chunk_rng(seed, cx, cy, stream):
+    return np.random.default_rng([seed, cx + SEED_BIAS, cy + SEED_BIAS, stream])
+
+def door(seed, cx, cy, stream, size):
+    # Смещение прохода на грани справа (STREAM_DOOR_X) или снизу (STREAM_DOOR_Y) от чанка
+    return int(chunk_rng(seed, cx, cy, stream).integers(3, size - 4))
+
+def carve(grid, x0, x1, y0, y1):
+    grid[min(y0, y1):max(y0, y1) + 2, min(x0, x1):max(x0, x1) + 2] = 0
+
+def chunk_tiles(seed, cx, cy, size):
+    # Тайлы чанка (size, size) uint8: 0 — пол, 1 — стена
+    rng = chunk_rng(seed, cx, cy, STREAM_TILES)
+    grid = np.ones((size, size), np.uint8)
+    c = size // 2
+    rw, rh = rng.integers(5, 11, 2).tolist()
+    rx = min(max(2, c - rw // 2 + int(rng.integers(-6, 7))), size - rw - 2)
+    ry = min(max(2, c - rh // 2 + int(rng.integers(-6, 7))), size - rh - 2)
+    grid[ry:ry + rh, rx:rx + rw] = 0
+    xs, ys = random_walk(rng, c, c, size * size // 2, 1, size - 2, 1, size - 2)
+    grid[ys, xs] = 0
+    smooth_walls(grid)
+    # Коридоры шириной 2 от проходов во все четыре соседа к центру
+    e, w = door(seed, cx, cy, STREAM_DOOR_X, size), door(seed, cx - 1, cy, STREAM_DOOR_X, size)
+    s, n = door(seed, cx, cy, STREAM_DOOR_Y, size), door(seed, cx, cy - 1, STREAM_DOOR_Y, size)
+    carve(grid, c, size - 2, e, e); carve(grid, c, c, e, c)
+    carve(grid, 0, c, w, w); carve(grid, c, c, w, c)
+    carve(grid, s, s, c, size - 2); carve(grid, s, c, c, c)
+    carve(grid, n, n, 0, c); carve(grid, n, c, c, c)
+    if (cx, cy) == (0, 0):
+        # Стартовая комната: магазин в центре, выход справа от него
+        grid[c - 4:c + 5, c - 5:c + 11] = 0
+    return grid
+
+def populate_chunk(g, seed, cx, cy, grid, x0, y0):
+    # Сокровища и враги свежего чанка; (x0, y0) — его левый верхний тайл в окне
+    rng = chunk_rng(seed, cx, cy, STREAM_SPAWN)
+    size = grid.shape[0]
+    diff = DIFFS[g.settings["difficulty"]]
+    ys, xs = np.nonzero(grid[2:-2, 2:-2] == 0)
+    xs, ys = xs + 2, ys + 2
+    d = np.abs(xs - size // 2) + np.abs(ys - size // 2)
+    spawn = (cx, cy) == (0, 0)
+
+    txs, tys = (xs[d > 6], ys[d > 6]) if spawn else (xs, ys)
+    num = min(int(len(xs) * g.settings["treasure_density"]), len(txs))
+    if num:
+        pick = rng.choice(len(txs), size=num, replace=False)
+        weights = np.array([t["weight"] for t in TREASURE_TYPES], np.float64)
+        types = rng.choice(len(TREASURE_TYPES), size=num, p=weights / weights.sum())
+        for tx, ty, kind in zip(txs[pick].tolist(), tys[pick].tolist(), types.tolist()):
+            g.treasures.append(Treasure(pygame.Vector2((x0 + tx) * TILE + TILE / 2, (y0 + ty) * TILE + TILE / 2), kind))
+
+    exs, eys = (xs[d > 8], ys[d > 8]) if spawn else (xs, ys)
+    num = max(1, int(size * size / 160 * diff["enemy_mult"]))
+    if len(exs):
+        pick = rng.integers(0, len(exs), num)
+        g.enemies.add_many((x0 + exs[pick]) * TILE + TILE / 2, (y0 + eys[pick]) * TILE + TILE / 2,
+                           rng.random(num) < diff["spitter_chance"], rng.random(num) * 10.0,
+                           rng.uniform(0.0, 1.2, num))
+
+# Запись спящего чанка (zlib): заголовок, поля врагов по EnemyStore.FIELDS,
+# сокровища (x, y, тип), биты тумана. Координаты — от угла чанка.
+REC_HEAD = struct.Struct("<II")     # врагов, сокровищ
+
+def pack_chunk(enemies, treasures, visited):
+    parts = [REC_HEAD.pack(len(enemies["x"]), len(treasures))]
+    parts += [np.ascontiguousarray(enemies[name], dtype).tobytes() for name, dtype in EnemyStore.FIELDS]
+    parts.append(np.array([t.pos.x for t in treasures], np.float64).tobytes())
+    parts.append(np.array([t.pos.y for t in treasures], np.float64).tobytes())
+    parts.append(np.array([t.type for t in treasures], np.uint8).tobytes())
+    parts.append(np.packbits(visited).tobytes())
+    return zlib.compress(b"".join(parts), 1)
+
+def unpack_chunk(blob, size):
+    # -> (поля врагов, [(x, y, тип)], туман (size, size) bool)
+    data = zlib.decompress(blob)
+    ne, nt = REC_HEAD.unpack_from(data)
+    off = REC_HEAD.size
+
+    def take(dtype, count):
+        nonlocal off
+        arr = np.frombuffer(data, dtype, count, off)
+        off += arr.nbytes
+        return arr
+
+    enemies = {name: take(dtype, ne) for name, dtype in EnemyStore.FIELDS}
+    tx, ty, tt = take(np.float64, nt), take(np.float64, nt), take(np.uint8, nt)
+    visited = np.unpackbits(take(np.uint8, (size * size + 7) // 8), count=size * size).reshape(size, size)
+    return enemies, list(zip(tx.tolist(), ty.tolist(), tt.tolist())), visited
+
+class ChunkArchive:
+    # Спящие чанки по глобальным координатам. Последние mem_limit записей —
+    # в памяти (LRU), более старые вытесняются во временный файл. Проснувшийся
+    # чанк оставляет в файле мёртвые байты; когда их больше, чем живых (и не
+    # меньше ARCHIVE_COMPACT_MIN), файл переписывается без них — иначе игрок,
+    # ходящий туда-обратно через границу чанка, растил бы его без предела
+    def __init__(self, mem_limit=WORLD_ARCHIVE_MEM):
+        self.mem_limit = mem_limit
+        self.mem = OrderedDict()
+        self.disk = {}      # ключ -> (смещение, длина) в self.file
+        self.file = None
+        self.size = 0       # длина файла
+        self.dead = 0       # из них байт проснувшихся чанков
+
+    def __len__(self):
+        return len(self.mem) + len(self.disk)
+
+    def put(self, key, blob):
+        self.mem[key] = blob
+        self.mem.move_to_end(key)
+        while len(self.mem) > self.mem_limit:
+            k, b = self.mem.popitem(last=False)
+            if self.file is None:
+                self.file = tempfile.TemporaryFile()
+            self.file.seek(self.size)
+            self.disk[k] = (self.size, len(b))
+            self.file.write(b)
+            self.size += len(b)
+
+    def pop(self, key):
+        blob = self.mem.pop(key, None)
+        if blob is None and key in self.disk:
+            off, n = self.disk.pop(key)
+            self.file.seek(off)
+            blob = self.file.read(n)
+            self.dead += n
+            if self.dead > max(self.size - self.dead, ARCHIVE_COMPACT_MIN):
+                self.compact()
+        return blob
+
+    def compact(self):
+        # Переписать живые записи подряд в новый файл
+        new = tempfile.TemporaryFile()
+        disk = {}
+        for key, blob in self.items_on_disk():
+            disk[key] = (new.tell(), len(blob))
+            new.write(blob)
+        self.file.close()
+        self.file, self.disk = new, disk
+        self.size, self.dead = new.tell(), 0
+
+    def items_on_disk(self):
+        for key, (off, n) in self.disk.items():
+            self.file.seek(off)
+            yield key, self.file.read(n)
+
+    def items(self):
+        # Все записи от старых к новым (для снимка), порядок LRU не меняется
+        yield from self.items_on_disk()
+        yield from self.mem.items()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.size = self.dead = 0
+        self.mem.clear()
+        self.disk.clear()
+
+class StreamingWorld:
+    def __init__(self, seed, chunk=WORLD_CHUNK, window=WORLD_WINDOW):
+        self.seed = seed
+        self.chunk = chunk
+        self.window = window
+        self.ox = self.oy = -(window // 2)   # глобальный чанк в левом верхнем углу окна
+        self.archive = ChunkArchive()
+
+    def close(self):
+        self.archive.close()
+
+    def generate(self, g, progress=None):
+        # Начальное окно вокруг чанка (0, 0); замена generate_new_floor
+        # (тоже только данные — см. loader.build_floor)
+        n, size = self.window, self.chunk
+        g.MAP_W = g.MAP_H = n * size
+        g.tiles = TileMap(g.MAP_W, g.MAP_H, fill=1)
+        g.treasures.clear()
+        g.enemies.clear()
+        for j in range(n):
+            for i in range(n):
+                if progress is not None:
+                    progress((j * n + i) / (n * n), "Чанки")
+                self._wake(g, i, j)
+        g.spawn_tx = g.spawn_ty = (n // 2) * size + size // 2
+        g.shop_rect.x = (g.spawn_tx - 3) * TILE
+        g.shop_rect.y = (g.spawn_ty - 2) * TILE
+        g.exit_rect = pygame.Rect((g.spawn_tx + 7) * TILE, (g.spawn_ty - 1) * TILE, TILE * 2, TILE * 2)
+        diff = DIFFS[g.settings["difficulty"]]
+        g.TARGET_GOLD = max(200, int(int(g.MAP_W * g.MAP_H * 0.12) * diff["target_mult"]))
+
+    def _wake(self, g, i, j, visited=None):
+        # Чанк окна (i, j): тайлы по сиду, объекты — из архива или свежие
+        size = self.chunk
+        gx, gy = self.ox + i, self.oy + j
+        x0, y0 = i * size, j * size
+        grid = chunk_tiles(self.seed, gx, gy, size)
+        g.tiles.view[y0:y0 + size, x0:x0 + size] = grid
+        blob = self.archive.pop((gx, gy))
+        if blob is None:
+            populate_chunk(g, self.seed, gx, gy, grid, x0, y0)
+            return
+        enemies, treasures, vis = unpack_chunk(blob, size)
+        enemies["x"] = enemies["x"] + x0 * TILE
+        enemies["y"] = enemies["y"] + y0 * TILE
+        g.enemies.put(enemies)
+        for x, y, kind in treasures:
+            g.treasures.append(Treasure(pygame.Vector2(x + x0 * TILE, y + y0 * TILE), kind))
+        if visited is not None:
+            visited[y0:y0 + size, x0:x0 + size] = vis
+
+    def update(self, g):
+        # Держать игрока в центральном чанке окна
+        cp = self.chunk * TILE
+        c = self.window // 2
+        i, j = int(g.player.pos.x // cp), int(g.player.pos.y // cp)
+        if (i, j) != (c, c):
+            self.shift(g, i - c, j - c)
+
+    def shift(self, g, di, dj):
+        n, size = self.window, self.chunk
+        cp = size * TILE
+        dx, dy = di * cp, dj * cp
+
+        def leaving(ci, cj):
+            return (ci - di < 0) | (ci - di >= n) | (cj - dj < 0) | (cj - dj >= n)
+
+        # Усыпить уходящие чанки (запись есть у каждого, даже пустого:
+        # иначе при возвращении он заселится заново)
+        en = g.enemies
+        ei = np.clip(np.floor_divide(en.x[:en.n], cp).astype(np.intp), 0, n - 1)
+        ej = np.clip(np.floor_divide(en.y[:en.n], cp).astype(np.intp), 0, n - 1)
+        out = leaving(ei, ej)
+        gone = en.take(out)
+        ei, ej = ei[out], ej[out]
+        keep, asleep = [], {}
+        for t in g.treasures:
+            ti = min(max(int(t.pos.x // cp), 0), n - 1)
+            tj = min(max(int(t.pos.y // cp), 0), n - 1)
+            if leaving(ti, tj):
+                t.pos.x -= ti * cp
+                t.pos.y -= tj * cp
+                asleep.setdefault((ti, tj), []).append(t)
+            else:
+                keep.append(t)
+        vis = g.visited.view
+        for j in range(n):
+            for i in range(n):
+                if not leaving(i, j):
+                    continue
+                sel = (ei == i) & (ej == j)
+                fields = {name: arr[sel] for name, arr in gone.items()}
+                fields["x"] = fields["x"] - i * cp
+                fields["y"] = fields["y"] - j * cp
+                cells = vis[j * size:(j + 1) * size, i * size:(i + 1) * size] != 0
+                self.archive.put((self.ox + i, self.oy + j), pack_chunk(fields, asleep.get((i, j), []), cells))
+
+        # Сдвинуть окно: оставшееся переезжает, входящие чанки просыпаются
+        g.tiles.view[:] = np.roll(g.tiles.view, (-dj * size, -di * size), axis=(0, 1))
+        vis[:] = np.roll(vis, (-dj * size, -di * size), axis=(0, 1))
+        self.ox += di
+        self.oy += dj
+        en.x[:en.n] -= dx
+        en.y[:en.n] -= dy
+        for t in keep:
+            t.pos.x -= dx
+            t.pos.y -= dy
+        g.treasures[:] = keep
+        for j in range(n):
+            for i in range(n):
+                if not (0 <= i + di < n and 0 <= j + dj < n):
+                    vis[j * size:(j + 1) * size, i * size:(i + 1) * size] = 0
+                    self._wake(g, i, j, vis)
+
+        # Всё прочее в мировых координатах
+        g.player.pos.x -= dx
+        g.player.pos.y -= dy
+        g.cam.x -= dx
+        g.cam.y -= dy
+        g.spawn_tx -= di * size
+        g.spawn_ty -= dj * size
+        g.shop_rect.move_ip(-dx, -dy)
+        if g.exit_rect:
+            g.exit_rect.move_ip(-dx, -dy)
+        pool = g.projectiles
+        i = 0
+        while i < pool.n:
+            p = pool.items[i]
+            p.pos.x -= dx
+            p.pos.y -= dy
+            if not (0 <= p.pos.x < g.MAP_W * TILE and 0 <= p.pos.y < g.MAP_H * TILE):
+                pool.kill(i); continue
+            i += 1
+        for ft in g.float_texts:
+            ft.pos.x -= dx
+            ft.pos.y -= dy
+        g.particles.pos[:g.particles.n] -= (dx, dy)
+
+        g.treasure_grid.rebuild(g.treasures)
+        g.tile_cache.shift(g, di * size, dj * size)
+        g.minimap.reset(g)
+        g.fov.reset()
+        g.flow.reset()
+        update_visited_by_player(g)